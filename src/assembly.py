@@ -0,0 +1,147 @@
+from typing import Optional
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from models import TrussData
+
+
+def element_arrays(truss: TrussData) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Node coordinates, element connectivity and per-element E/A of a truss."""
+    return truss.coords, truss.connectivity, truss.E, truss.A
+
+
+def element_geometry(coords: np.ndarray, connectivity: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return element lengths (m,) and direction cosines (m, 2) as (cos, sin) pairs."""
+    delta = coords[connectivity[:, 1]] - coords[connectivity[:, 0]]
+    lengths = np.hypot(delta[:, 0], delta[:, 1])
+    cos_sin = delta / lengths[:, None]
+    return lengths, cos_sin
+
+
+def element_dofs(connectivity: np.ndarray) -> np.ndarray:
+    """Global DOF indices (m, 4) in the same order as Element.getDOFs."""
+    dofs = np.empty((connectivity.shape[0], 4), dtype=np.int64)
+    dofs[:, 0::2] = connectivity * 2
+    dofs[:, 1::2] = connectivity * 2 + 1
+    return dofs
+
+
+def element_stiffness_blocks(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        E: np.ndarray,
+        A: np.ndarray,
+) -> np.ndarray:
+    """
+    Compute the global 4x4 stiffness matrix of every element at once.
+
+    Equivalent to stacking Element.stiffness() for all elements, shape (m, 4, 4).
+    """
+    lengths, cos_sin = element_geometry(coords, connectivity)
+    base = E * A / lengths
+
+    # local 2x2 block base * [cos, sin]^T [cos, sin] for every element
+    local = base[:, None, None] * cos_sin[:, :, None] * cos_sin[:, None, :]
+
+    blocks = np.empty((connectivity.shape[0], 4, 4), dtype=float)
+    blocks[:, :2, :2] = local
+    blocks[:, :2, 2:] = -local
+    blocks[:, 2:, :2] = -local
+    blocks[:, 2:, 2:] = local
+    return blocks
+
+
+def stiffness_product(blocks: np.ndarray, dofs: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """K @ vectors for global vectors of shape (dofs, columns), applied element by element."""
+    element_forces = np.einsum("eij,ejc->eic", blocks, vectors[dofs])
+    product = np.zeros(vectors.shape)
+    np.add.at(product, dofs.ravel(), element_forces.reshape(-1, vectors.shape[1]))
+    return product
+
+
+def assemble_stiffness(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        E: np.ndarray,
+        A: np.ndarray,
+        total_dof_count: int,
+        dof_order: Optional[np.ndarray] = None,
+) -> csr_matrix:
+    """
+    Assemble the global stiffness matrix from element arrays in a single COO -> CSR pass.
+
+    If dof_order is given, K is assembled directly in that symmetric permutation,
+    i.e. row/column i of the result belongs to global DOF dof_order[i].
+    """
+    dofs = element_dofs(connectivity)
+    if dof_order is not None:
+        position = np.empty(total_dof_count, dtype=np.int64)
+        position[dof_order] = np.arange(total_dof_count)
+        dofs = position[dofs]
+    blocks = element_stiffness_blocks(coords, connectivity, E, A)
+
+    # blocks[e, i, j] belongs to K[dofs[e, i], dofs[e, j]]
+    rows = np.repeat(dofs, 4, axis=1).ravel()
+    cols = np.tile(dofs, (1, 4)).ravel()
+
+    # duplicate (row, col) pairs of shared nodes are summed by the CSR conversion
+    return coo_matrix(
+        (blocks.ravel(), (rows, cols)),
+        shape=(total_dof_count, total_dof_count),
+    ).tocsr()
+
+
+def assemble_truss_stiffness(truss: TrussData, dof_order: Optional[np.ndarray] = None) -> csr_matrix:
+    """Assemble the global stiffness matrix K of a truss, optionally permuted to dof_order."""
+    coords, connectivity, E, A = element_arrays(truss)
+    return assemble_stiffness(coords, connectivity, E, A, truss.total_dof_count, dof_order)
+
+
+def axial_forces(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        E: np.ndarray,
+        A: np.ndarray,
+        displacements: np.ndarray,
+) -> np.ndarray:
+    """
+    Axial force of every element from a global displacement vector.
+
+    displacements has shape (dofs,) or (dofs, cases); the result is (m,) or (m, cases).
+    Equivalent to Element.axial_force() after Element.set_local_deformations(displacements).
+    """
+    lengths, cos_sin = element_geometry(coords, connectivity)
+
+    node_displacements = displacements.reshape(coords.shape[0], 2, -1)
+    delta = node_displacements[connectivity[:, 1]] - node_displacements[connectivity[:, 0]]
+
+    # elongation projected on the element axis, (m, cases)
+    elongation = np.einsum("ed,edc->ec", cos_sin, delta)
+    forces = (E * A / lengths)[:, np.newaxis] * elongation
+    return forces.reshape(connectivity.shape[0], *displacements.shape[1:])
+
+
+def homogenized_stress(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        forces: np.ndarray,
+        volume: float,
+) -> np.ndarray:
+    """
+    Averaged stress 1/V * sum(L * N * n n^T) from element axial forces.
+
+    forces has shape (m,) or (m, cases); returns (xx, yy, xy) as shape (3,) or (3, cases),
+    with the shear component doubled like the solvers have always reported it.
+    """
+    lengths, cos_sin = element_geometry(coords, connectivity)
+    weighted = (1 / volume) * lengths[:, np.newaxis] * forces.reshape(connectivity.shape[0], -1)
+
+    cos = cos_sin[:, 0]
+    sin = cos_sin[:, 1]
+    stress = np.stack([
+        (cos * cos) @ weighted,  # xx
+        (sin * sin) @ weighted,  # yy
+        2 * (cos * sin) @ weighted,  # xy
+    ])
+    return stress.reshape(3, *forces.shape[1:])
@@ -0,0 +1,195 @@
+from typing import Optional, Sequence
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+from assembly import axial_forces, element_arrays, element_dofs, element_geometry, element_stiffness_blocks
+from constraints import CompiledConstraints, constraint_arrays
+from linear_solver import DENSE_THRESHOLD
+from models import TrussData
+
+
+class TopologyMismatchError(ValueError):
+    """Raised by BatchTrussSolver when the trusses of a batch do not share one topology."""
+
+
+class BatchTrussSolver:
+    """
+    Solve many small trusses that share one topology with batched dense linear algebra.
+
+    All trusses must have the same nodes count, element connectivity, fixed DOFs and
+    master relations; coordinates, E/A, loads, deformations and eigenstrains may differ.
+    For tiny unit cells this avoids most of the per-structure scipy.sparse setup: the reduced
+    stiffness T^T K T is assembled for the whole batch straight from the element blocks and
+    solved densely, so trusses above linear_solver.DENSE_THRESHOLD free DOFs are refused.
+    """
+
+    def __init__(self, trusses: Sequence[TrussData]):
+        if len(trusses) == 0:
+            raise ValueError("BatchTrussSolver needs at least one truss")
+
+        self.trusses = trusses
+
+        arrays = [element_arrays(truss) for truss in trusses]
+        self.connectivity = arrays[0][1]
+
+        # checked before stacking, trusses with other node counts can't be stacked
+        topology = constraint_arrays(trusses[0])
+        for index, (truss, (coords, connectivity, _, _)) in enumerate(zip(trusses, arrays)):
+            same_topology = (
+                coords.shape == arrays[0][0].shape
+                and np.array_equal(connectivity, self.connectivity)
+                and all(np.array_equal(a, b) for a, b in zip(constraint_arrays(truss), topology))
+            )
+            if not same_topology:
+                raise TopologyMismatchError(f"Truss {index} does not share the topology of truss 0")
+
+        self.coords = np.array([coords for coords, _, _, _ in arrays])
+        self.E = np.array([E for _, _, E, _ in arrays])
+        self.A = np.array([A for _, _, _, A in arrays])
+        self.volumes = np.array([truss.volume for truss in trusses], dtype=float)
+
+        self.constraints = CompiledConstraints.from_arrays(trusses[0].total_dof_count, *topology)
+        free_count = len(self.constraints.free_dofs)
+        if free_count > DENSE_THRESHOLD:
+            raise ValueError(
+                f"BatchTrussSolver solves dense reduced systems, {free_count} free DOFs exceed "
+                f"linear_solver.DENSE_THRESHOLD ({DENSE_THRESHOLD}); solve these trusses with TrussSolver"
+            )
+
+        self.loads = np.array([truss.loads.reshape(-1) for truss in trusses])
+        self.deformations = np.array([truss.deformations.reshape(-1) for truss in trusses])
+
+    def _flat_elements(self) -> tuple[np.ndarray, np.ndarray]:
+        """Coordinates and connectivity of the whole batch as one disjoint truss."""
+        batch_size, node_count, _ = self.coords.shape
+        offsets = np.arange(batch_size)[:, np.newaxis, np.newaxis] * node_count
+        connectivity = (self.connectivity[np.newaxis] + offsets).reshape(-1, 2)
+        return self.coords.reshape(-1, 2), connectivity
+
+    def reduced_scatter(self) -> csr_matrix:
+        """
+        Sparse map from the element blocks (m * 16 entries) to the reduced stiffness T^T K T (free * free).
+
+        Entry (e, i, j) of the blocks adds T[dofs[e, i], p] * T[dofs[e, j], q] to entry (p, q), which is
+        G^T blockdiag(K_e) G with G = T[dofs]. The map only depends on the topology, so it is built once
+        and applied to the blocks of every truss; the full K is never formed.
+        """
+        T = self.constraints.free_transformation()
+        free_count = T.shape[1]
+        gather = T[element_dofs(self.connectivity).ravel()].tocsr()
+        gather.sort_indices()
+
+        # gather rows of the left and right DOF of every block entry
+        element_rows = np.arange(len(self.connectivity))[:, np.newaxis] * 4 + np.arange(4)
+        left = np.repeat(element_rows, 4, axis=1).ravel()
+        right = np.tile(element_rows, (1, 4)).ravel()
+
+        # every pair of non-zeros of the two gather rows contributes to one reduced entry
+        left_count = np.diff(gather.indptr)[left]
+        right_count = np.diff(gather.indptr)[right]
+        pair_count = left_count * right_count
+        entry = np.repeat(np.arange(len(left)), pair_count)
+        pair = np.arange(len(entry)) - np.repeat(np.cumsum(pair_count) - pair_count, pair_count)
+        left_position = gather.indptr[left][entry] + pair // right_count[entry]
+        right_position = gather.indptr[right][entry] + pair % right_count[entry]
+
+        return coo_matrix(
+            (
+                gather.data[left_position] * gather.data[right_position],
+                (gather.indices[left_position] * free_count + gather.indices[right_position], entry),
+            ),
+            shape=(free_count * free_count, len(left)),
+        ).tocsr()
+
+    def reduced_stiffness_matrices(self, blocks: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dense reduced stiffness T^T K T of all trusses, shape (batch, free, free), see reduced_scatter."""
+        if blocks is None:
+            blocks = self.element_blocks()
+        batch_size = self.coords.shape[0]
+        free_count = len(self.constraints.free_dofs)
+        return (self.reduced_scatter() @ blocks.reshape(batch_size, -1).T).T.reshape(batch_size, free_count, free_count)
+
+    def element_blocks(self) -> np.ndarray:
+        """Element stiffness blocks of all trusses, shape (batch, m, 4, 4)."""
+        coords, connectivity = self._flat_elements()
+        blocks = element_stiffness_blocks(coords, connectivity, self.E.ravel(), self.A.ravel())
+        return blocks.reshape(self.coords.shape[0], -1, 4, 4)
+
+    def solve_macro_strains(self, macro_strains: np.ndarray) -> np.ndarray:
+        """
+        solve_eigenstrains for macroscopic eigenstrains (cases, 3) as (x, y, angle) shared by all trusses,
+        the offsets of every truss come from its own eigenstrain operator.
+        """
+        return self.solve_eigenstrains(np.array([truss.macro_eigenstrains(macro_strains) for truss in self.trusses]))
+
+    def solve_eigenstrains(self, eigenstrains: np.ndarray) -> np.ndarray:
+        """
+        Solve every truss for several eigenstrain load cases.
+
+        eigenstrains holds per-node offsets of shape (batch, cases, nodes, 2), laid out like
+        Node.eigenstrain. Returns homogenized stresses of shape (batch, 3, cases), i.e. the
+        per-truss layout of TrussSolver.solve_eigenstrains.
+        """
+        constraints = self.constraints
+        batch_size = self.coords.shape[0]
+        dof_count = constraints.total_dof_count
+        cases = eigenstrains.shape[1]
+
+        free_dofs = constraints.free_dofs
+        dependent_dofs = constraints.dependent_dofs
+        fixed_dofs = constraints.fixed_dofs
+
+        # u_global = T @ u_free + shift
+        T = constraints.free_transformation()
+
+        def apply(matrix: csr_matrix, values: np.ndarray) -> np.ndarray:
+            # sparse matrix times the middle axis of a (batch, n, cases) stack
+            result = matrix @ values.transpose(1, 0, 2).reshape(values.shape[1], -1)
+            return result.reshape(matrix.shape[0], batch_size, -1).transpose(1, 0, 2)
+
+        raw_offsets = eigenstrains.reshape(batch_size, cases, dof_count)[:, :, dependent_dofs]
+        a_dependant = apply(constraints.offset_transfer, raw_offsets.transpose(0, 2, 1))
+        u_fixed = self.deformations[:, fixed_dofs]
+        dependent_shift = apply(constraints.XD2, u_fixed[:, :, np.newaxis]) + a_dependant
+
+        shift = np.zeros((batch_size, dof_count, cases))
+        shift[:, dependent_dofs] = dependent_shift
+
+        f = np.zeros((batch_size, dof_count))
+        f[:, free_dofs] = self.loads[:, free_dofs]
+        f[:, dependent_dofs] = self.loads[:, dependent_dofs]
+
+        # same reduction as TrussSolver: T^T K T u_free = T^T (f - K shift), assembled per element
+        blocks = self.element_blocks()
+        dofs = element_dofs(self.connectivity)
+        element_shift = shift[:, dofs]  # (batch, m, 4, cases)
+        element_forces = np.einsum("bmij,bmjc->bmic", blocks, element_shift)
+        gather = T[dofs.ravel()].tocsr()
+
+        assembled_K = self.reduced_stiffness_matrices(blocks)
+        assembled_F = apply(T.T.tocsr(), f[:, :, np.newaxis]) - apply(
+            gather.T.tocsr(), element_forces.reshape(batch_size, -1, cases)
+        )
+
+        u_free = np.linalg.solve(assembled_K, assembled_F)
+
+        displacements = apply(T, u_free) + shift
+        displacements[:, fixed_dofs] = u_fixed[:, :, np.newaxis]
+        self.displacements = displacements
+
+        coords, connectivity = self._flat_elements()
+        forces = axial_forces(
+            coords, connectivity, self.E.ravel(), self.A.ravel(), displacements.reshape(-1, cases)
+        )
+        self.axial_forces = forces.reshape(batch_size, -1, cases)
+
+        lengths, cos_sin = element_geometry(coords, connectivity)
+        weighted = (lengths[:, np.newaxis] * forces).reshape(batch_size, -1, cases)
+        weighted /= self.volumes[:, np.newaxis, np.newaxis]
+
+        cos = cos_sin[:, 0]
+        sin = cos_sin[:, 1]
+        projections = np.stack([cos * cos, sin * sin, 2 * cos * sin], axis=-1).reshape(batch_size, -1, 3)
+
+        return np.einsum("bmk,bmc->bkc", projections, weighted)
@@ -0,0 +1,147 @@
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from structure_parser import StructureDefinition
+
+# bump when a solver change makes stored results stale
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# eviction removes entries until the cache is back below this share of max_bytes
+EVICTION_TARGET = 0.9
+
+
+def structure_key(definition: StructureDefinition, eigenstrains: np.ndarray) -> str:
+    """
+    Canonical content hash of a structure and the macroscopic eigenstrains it is solved for.
+
+    Two definitions with the same field values share a key no matter how they were built
+    (JSON file, generator, ...); floats are hashed exactly.
+    """
+    payload = json.dumps(
+        {
+            "version": CACHE_VERSION,
+            "structure": dataclasses.asdict(definition),
+            "eigenstrains": np.asarray(eigenstrains, dtype=float).tolist(),
+        },
+        sort_keys=True,
+        default=lambda value: value.item() if isinstance(value, np.generic) else str(value),
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+class HomogenizationCache:
+    """
+    On-disk memoization of D matrices (and optionally displacement fields), keyed by structure_key.
+
+    Every entry is one .npz file written to a temporary file and renamed into place, so readers in
+    other processes see either no entry or a complete one. A hit refreshes the file time; when the
+    cache grows above max_bytes the least recently used entries are removed. Entries that vanish or
+    turn out unreadable under a concurrent eviction are treated as misses.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            store_displacements: bool = False,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.store_displacements = store_displacements
+        # size estimate of this process, refreshed by every eviction scan
+        self._size: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".npz")
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Stored arrays of an entry ("D" and possibly "displacements"), None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                entry = {name: data[name] for name in data.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None
+        # touch for the LRU order; a read-only cache or a concurrent eviction must not turn a hit into a miss
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, D: np.ndarray, displacements: Optional[np.ndarray] = None) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        arrays = {"D": D}
+        if displacements is not None and self.store_displacements:
+            arrays["displacements"] = displacements
+
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as f:
+                np.savez(f, **arrays)
+            size = os.path.getsize(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".npz"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self) -> int:
+        """Total size of the stored entries in bytes."""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is below EVICTION_TARGET * max_bytes."""
+        entries = sorted(self._entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        target = EVICTION_TARGET * self.max_bytes
+
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another process evicted it first
+            size -= entry_size
+
+        self._size = size
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._size = 0
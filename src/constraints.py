@@ -0,0 +1,211 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.sparse import bmat, coo_matrix, csr_matrix, identity
+
+from models import TrussData
+
+# number of compiled constraint sets kept by compile_constraints
+CONSTRAINT_CACHE_SIZE = 32
+
+
+@dataclass
+class CompiledConstraints:
+    """
+    DOF classification and constraint transformation of a truss topology.
+
+    Everything here depends only on which DOFs are fixed and on the master/slave
+    relations, not on loads, deformations or eigenstrains, so one instance can be
+    reused by every solve on the same topology.
+    """
+    total_dof_count: int
+    free_dofs: np.ndarray
+    dependent_dofs: np.ndarray
+    fixed_dofs: np.ndarray
+    XD1: csr_matrix  # dependent <- free
+    XD2: csr_matrix  # dependent <- fixed
+    X: csr_matrix  # full [free; dependent; fixed] <- [free; fixed] transformation
+    # maps the raw eigenstrain offsets of the dependent DOFs to the offsets after
+    # resolving chained dependencies (identity when no master is itself dependent)
+    offset_transfer: csr_matrix
+
+    @classmethod
+    def from_arrays(
+            cls,
+            total_dof_count: int,
+            constrained: np.ndarray,
+            dependent_dof: np.ndarray,
+            master_dof: np.ndarray,
+            factor: np.ndarray,
+    ) -> 'CompiledConstraints':
+        """
+        Compile constraints from array data.
+
+        constrained is a boolean mask over all DOFs; dependent_dof, master_dof and
+        factor describe one master relation per entry (u[dependent] += factor * u[master]).
+        """
+        dependent_mask = np.zeros(total_dof_count, dtype=bool)
+        dependent_mask[dependent_dof] = True
+        fixed_mask = constrained & ~dependent_mask
+
+        """
+        Classification example with 3 nodes (6 DOFs):
+          Free DOFs:      [0, 3]         (Node 0-x, Node 1-y)
+          Dependent DOFs: [1, 4]         (Node 0-y, Node 2-x)
+          Fixed DOFs:     [2, 5]         (Node 1-x, Node 2-y)
+
+          Global DOF indices: [0, 1, 2, 3, 4, 5]
+          Reordered DOFIDs:   [0, 3, 1, 4, 2, 5]
+                               ^  ^  ^  ^  ^  ^
+                               Free  Dependent  Fixed
+        """
+        free_dofs = np.flatnonzero(~dependent_mask & ~fixed_mask)
+        dependent_dofs = np.flatnonzero(dependent_mask)
+        fixed_dofs = np.flatnonzero(fixed_mask)
+
+        free_count = len(free_dofs)
+        dependent_count = len(dependent_dofs)
+        fixed_count = len(fixed_dofs)
+
+        dependent_dof, master_dof, factor = deduplicate_relations(total_dof_count, dependent_dof, master_dof, factor)
+
+        # local indices of every DOF within its own group ([free; fixed] share one numbering)
+        dependent_index = np.full(total_dof_count, -1, dtype=np.int64)
+        dependent_index[dependent_dofs] = np.arange(dependent_count)
+        reduced_index = np.full(total_dof_count, -1, dtype=np.int64)
+        reduced_index[free_dofs] = np.arange(free_count)
+        reduced_index[fixed_dofs] = free_count + np.arange(fixed_count)
+
+        rows = dependent_index[dependent_dof]
+        master_is_dependent = dependent_mask[master_dof]
+
+        # direct masters that are free or fixed
+        XD = coo_matrix(
+            (factor[~master_is_dependent], (rows[~master_is_dependent], reduced_index[master_dof[~master_is_dependent]])),
+            shape=(dependent_count, free_count + fixed_count),
+        ).tocsr()
+
+        # masters that are themselves dependent
+        XDD = coo_matrix(
+            (factor[master_is_dependent], (rows[master_is_dependent], dependent_index[master_dof[master_is_dependent]])),
+            shape=(dependent_count, dependent_count),
+        ).tocsr()
+
+        offset_transfer = resolve_dependency_chains(XDD)
+        XD = (offset_transfer @ XD).tocsr()
+
+        # now we can split the XD matrix into XD1 (free DOFs) and XD2 (fixed DOFs)
+        XD1 = XD[:, :free_count]
+        XD2 = XD[:, free_count:]
+
+        """
+        X matrix structure:
+          +-------+-------+
+          │  X11  │  None │ <- Free DOFs
+          +-------+-------+
+          │  XD1  │  XD2  │ <- Dependent DOFs
+          +-------+-------+
+          │  None │  X22  │ <- Fixed DOFs
+          +-------+-------+
+             Free   Fixed
+        """
+        X = bmat([
+            [identity(free_count), None],
+            [XD1, XD2],
+            [None, identity(fixed_count)],
+        ], format="csr")
+
+        return cls(
+            total_dof_count=total_dof_count,
+            free_dofs=free_dofs,
+            dependent_dofs=dependent_dofs,
+            fixed_dofs=fixed_dofs,
+            XD1=XD1,
+            XD2=XD2,
+            X=X,
+            offset_transfer=offset_transfer,
+        )
+
+    def free_transformation(self) -> csr_matrix:
+        """Free columns of X with rows in global DOF order, i.e. u_global = T @ u_free for zero shifts."""
+        dof_order = np.concatenate([self.free_dofs, self.dependent_dofs, self.fixed_dofs])
+        position = np.empty(self.total_dof_count, dtype=np.int64)
+        position[dof_order] = np.arange(self.total_dof_count)
+        return self.X[:, :len(self.free_dofs)].tocsr()[position]
+
+    @classmethod
+    def from_truss(cls, truss: TrussData) -> 'CompiledConstraints':
+        return cls.from_arrays(truss.total_dof_count, *constraint_arrays(truss))
+
+
+def resolve_dependency_chains(XDD: csr_matrix) -> csr_matrix:
+    """
+    Return (I - XDD)^-1 for the dependent-on-dependent relation matrix XDD.
+
+    Substituting every dependent master by its own masters is the series
+    I + XDD + XDD^2 + ..., which terminates because acyclic chains are nilpotent.
+    """
+    count = XDD.shape[0]
+    transfer = identity(count, format="csr")
+    term = XDD.copy()
+    term.eliminate_zeros()
+
+    for _ in range(count):
+        if term.nnz == 0:
+            return transfer
+        transfer = transfer + term
+        term = (term @ XDD).tocsr()
+        term.eliminate_zeros()
+
+    if term.nnz != 0:
+        raise ValueError("Circular dependency between dependent DOFs")
+    return transfer
+
+
+def deduplicate_relations(
+        total_dof_count: int,
+        dependent_dof: np.ndarray,
+        master_dof: np.ndarray,
+        factor: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Drop repeated (dependent, master) pairs, the last occurrence overrides earlier ones."""
+    pair_keys = dependent_dof.astype(np.int64) * total_dof_count + master_dof
+    _, last = np.unique(pair_keys[::-1], return_index=True)
+    keep = len(pair_keys) - 1 - last
+    return dependent_dof[keep], master_dof[keep], factor[keep]
+
+
+def constraint_arrays(truss: TrussData) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """The fixed-DOF mask over all DOFs and the master relations of a truss."""
+    return truss.constrained.reshape(-1), truss.dependent_dof, truss.master_dof, truss.master_factor
+
+
+_constraint_cache: 'OrderedDict[bytes, CompiledConstraints]' = OrderedDict()
+
+
+def compile_constraints(truss: TrussData) -> CompiledConstraints:
+    """
+    Compile the constraints of a truss, reusing an earlier result for the same topology.
+
+    Trusses that only differ in loads, deformations or eigenstrains share one entry.
+    """
+    total_dof_count = truss.total_dof_count
+    arrays = constraint_arrays(truss)
+
+    digest = hashlib.blake2b(np.int64(total_dof_count).tobytes())
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    key = digest.digest()
+
+    cached = _constraint_cache.get(key)
+    if cached is not None:
+        _constraint_cache.move_to_end(key)
+        return cached
+
+    compiled = CompiledConstraints.from_arrays(total_dof_count, *arrays)
+    _constraint_cache[key] = compiled
+    if len(_constraint_cache) > CONSTRAINT_CACHE_SIZE:
+        _constraint_cache.popitem(last=False)
+    return compiled
@@ -0,0 +1,49 @@
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+
+
+def macro_strain_coefficients(macro_strains: np.ndarray) -> np.ndarray:
+    """
+    Turn macroscopic eigenstrains (x, y, angle), laid out like EigenstrainDefinition, into the
+    coefficients (x, y, tan(angle)) the eigenstrain offsets are linear in. Works on (..., 3).
+    """
+    macro_strains = np.asarray(macro_strains, dtype=float)
+    coefficients = macro_strains.copy()
+    coefficients[..., 2] = np.tan(macro_strains[..., 2])
+    return coefficients
+
+
+def eigenstrain_operator(
+        coords: np.ndarray,
+        dependent_dof: np.ndarray,
+        master_dof: np.ndarray,
+        master_eigenstrain: np.ndarray,
+) -> csr_matrix:
+    """
+    Sparse operator (dofs, 3) from macro strain coefficients to the per-DOF eigenstrain offsets.
+
+    offsets = operator @ macro_strain_coefficients(strain) is the flattened (nodes, 2) layout of
+    Node.eigenstrain: every master relation that carries the eigenstrain shifts its dependent DOF by
+    -((x_master - x_dependent)[direction] * strain[direction] + tan(angle) / 2 * (x_master - x_dependent)[other]).
+    Only rows of dependent DOFs are non-zero.
+    """
+    carries = np.asarray(master_eigenstrain, dtype=bool)
+    dependent = np.asarray(dependent_dof, dtype=np.int64)[carries]
+    master = np.asarray(master_dof, dtype=np.int64)[carries]
+    direction = dependent % 2
+    other = 1 - direction
+
+    relation = np.arange(len(dependent))
+    dependent_coords = coords[dependent // 2]
+    master_coords = coords[master // 2]
+    along = master_coords[relation, direction] - dependent_coords[relation, direction]
+    across = master_coords[relation, other] - dependent_coords[relation, other]
+
+    # column direction takes the normal strain of the relation's direction, column 2 the shear
+    return coo_matrix(
+        (
+            np.concatenate([-along, -across / 2]),
+            (np.concatenate([dependent, dependent]), np.concatenate([direction, np.full(len(dependent), 2)])),
+        ),
+        shape=(coords.shape[0] * 2, 3),
+    ).tocsr()
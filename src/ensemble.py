@@ -0,0 +1,303 @@
+import argparse
+import math
+import os
+import time
+import warnings
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import stats
+
+from material_fit import FIT_METHODS
+from parameter_solver import eigenstrainSets
+from solver import TrussSolver
+from structure_parser import truss_from_arrays
+from sweep import FITS
+from vornoi_structure import max_poisson_points, periodic_voronoi_arrays, poisson_disk_points
+
+
+@dataclass
+class EnsembleResult:
+    """Realizations of one random Voronoi RVE and the statistics of their D matrices."""
+    num_points: int
+    width: float
+    height: float
+    Ds: np.ndarray  # (samples, 3, 3)
+    cells: np.ndarray  # (samples,) Voronoi cells of every realization, below num_points if sampling saturated
+    parameters: np.ndarray  # (samples, fit parameters), fitted per realization
+    parameter_names: tuple
+    confidence: float
+    converged: bool
+
+    @property
+    def samples(self) -> int:
+        return len(self.Ds)
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.Ds.mean(axis=0)
+
+    @property
+    def half_width(self) -> np.ndarray:
+        """Half width of the confidence interval of every mean D entry, (3, 3)."""
+        return confidence_half_width(self.Ds, self.confidence)
+
+    @property
+    def parameter_mean(self) -> np.ndarray:
+        return self.parameters.mean(axis=0)
+
+    @property
+    def parameter_half_width(self) -> np.ndarray:
+        return confidence_half_width(self.parameters, self.confidence)
+
+
+def confidence_half_width(samples: np.ndarray, confidence: float) -> np.ndarray:
+    """Student t confidence interval half width of the mean over axis 0, inf below two samples."""
+    count = len(samples)
+    if count < 2:
+        return np.full(samples.shape[1:], np.inf)
+    t = stats.t.ppf((1 + confidence) / 2, count - 1)
+    return t * samples.std(axis=0, ddof=1) / math.sqrt(count)
+
+
+def relative_half_width(Ds: np.ndarray, confidence: float) -> float:
+    # relative to the largest mean entry, the coupling entries are near zero and would never converge on their own
+    return float(confidence_half_width(Ds, confidence).max() / np.abs(Ds.mean(axis=0)).max())
+
+
+def solve_realization(task: tuple) -> Tuple[np.ndarray, int]:
+    """D matrix and cell count of one seeded realization, the pool task of the ensemble."""
+    width, height, num_points, point_radius, seed, E, thickness = task
+    # a saturated sampling is reported once per ensemble by _run_ensemble, not by every worker
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        points = poisson_disk_points(width, height, num_points, 2 * point_radius, seed)
+    arrays = periodic_voronoi_arrays(points, width, height, E, thickness)
+    truss = truss_from_arrays(arrays, width * height, np.zeros(3))
+    return TrussSolver(truss).solve_macro_strains(np.array(eigenstrainSets)), len(points)
+
+
+def _realizations(pool: Optional[Pool], tasks: List[tuple]) -> Iterator[Tuple[np.ndarray, int]]:
+    if pool is None:
+        return map(solve_realization, tasks)
+    return pool.imap(solve_realization, tasks)
+
+
+def _run_ensemble(
+        pool: Optional[Pool],
+        width: float,
+        height: float,
+        num_points: int,
+        point_radius: float,
+        tolerance: float,
+        confidence: float,
+        min_samples: int,
+        max_samples: int,
+        batch: int,
+        seed: int,
+        E: float,
+        thickness: float,
+        fit: str,
+        method: str,
+        verbose: bool,
+) -> EnsembleResult:
+    Ds = []
+    cells = []
+    converged = False
+    start_time = time.perf_counter()
+
+    while len(Ds) < max_samples:
+        count = min(max(batch, min_samples - len(Ds)), max_samples - len(Ds))
+        # realization i always uses the seed (seed, num_points, i), whatever the batching and worker count
+        tasks = [
+            (width, height, num_points, point_radius, (seed, num_points, index), E, thickness)
+            for index in range(len(Ds), len(Ds) + count)
+        ]
+        for D, cell_count in _realizations(pool, tasks):
+            Ds.append(D)
+            cells.append(cell_count)
+
+        error = relative_half_width(np.array(Ds), confidence)
+        if verbose:
+            elapsed = time.perf_counter() - start_time
+            print(f"{num_points} points | {len(Ds)} samples | CI {error:.2e} | {elapsed:.2f}s", end="\r")
+        if len(Ds) >= min_samples and error <= tolerance:
+            converged = True
+            break
+
+    if verbose:
+        print()
+
+    Ds = np.array(Ds)
+    cells = np.array(cells)
+    underfilled = np.count_nonzero(cells < num_points)
+    if underfilled:
+        warnings.warn(
+            f"{underfilled} of {len(cells)} realizations of {num_points} points saturated with fewer cells "
+            f"(down to {cells.min()}), point_radius {point_radius} is too large for a {width} x {height} cell",
+            RuntimeWarning,
+            stacklevel=3,
+        )
+
+    fit_function, parameter_names = FITS[fit]
+    return EnsembleResult(
+        num_points=num_points,
+        width=width,
+        height=height,
+        Ds=Ds,
+        cells=cells,
+        parameters=fit_function(Ds, method),
+        parameter_names=parameter_names,
+        confidence=confidence,
+        converged=converged,
+    )
+
+
+def _check_arguments(
+        fit: str,
+        method: str,
+        min_samples: int,
+        sizes: Sequence[Tuple[float, float, int]],
+        point_radius: float,
+):
+    # sizes are (width, height, num_points) of the RVEs to sample
+    for width, height, num_points in sizes:
+        limit = max_poisson_points(width, height, 2 * point_radius)
+        if num_points > limit:
+            raise ValueError(
+                f"{num_points} points with point_radius {point_radius} do not fit a {width} x {height} cell, "
+                f"even a hexagonal packing holds only {limit}"
+            )
+    if fit not in FITS:
+        raise ValueError(f"Unknown fit '{fit}', expected one of {tuple(FITS)}")
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method '{method}', expected one of {FIT_METHODS}")
+    if min_samples < 2:
+        raise ValueError("An ensemble needs at least two samples for a confidence interval")
+
+
+def run_ensemble(
+        width: float,
+        height: float,
+        num_points: int,
+        point_radius: float,
+        tolerance: float = 0.01,
+        confidence: float = 0.95,
+        min_samples: int = 5,
+        max_samples: int = 200,
+        batch: Optional[int] = None,
+        workers: int = 1,
+        seed: int = 0,
+        E: float = 210e6,
+        thickness: float = 1.0,
+        fit: str = "orto",
+        method: str = "least_squares",
+        verbose: bool = True,
+) -> EnsembleResult:
+    """
+    Monte Carlo estimate of the homogenized D of random periodic Voronoi cells, see voronoi_truss.
+
+    Seeded realizations are solved in batches (spread over a process pool with workers > 1) until the
+    confidence interval of every mean D entry is within tolerance of the largest mean entry, or
+    max_samples are solved. At least min_samples are always solved. Every realization is also fitted
+    with the given fit. The same seed gives the same realizations for any batch size and worker count.
+    A point_radius too large for num_points to fit raises a ValueError up front; realizations whose
+    sampling saturated below num_points are counted in cells and reported with a RuntimeWarning.
+    """
+    _check_arguments(fit, method, min_samples, [(width, height, num_points)], point_radius)
+    batch = batch or max(workers, 1)
+    arguments = (
+        width, height, num_points, point_radius, tolerance, confidence, min_samples, max_samples,
+        batch, seed, E, thickness, fit, method, verbose,
+    )
+    if workers <= 1:
+        return _run_ensemble(None, *arguments)
+    with Pool(workers) as pool:
+        return _run_ensemble(pool, *arguments)
+
+
+def rve_size_study(
+        point_counts: Sequence[int],
+        width: float,
+        height: float,
+        point_radius: float,
+        size_tolerance: Optional[float] = None,
+        tolerance: float = 0.01,
+        confidence: float = 0.95,
+        min_samples: int = 5,
+        max_samples: int = 200,
+        batch: Optional[int] = None,
+        workers: int = 1,
+        seed: int = 0,
+        E: float = 210e6,
+        thickness: float = 1.0,
+        fit: str = "orto",
+        method: str = "least_squares",
+        verbose: bool = True,
+) -> List[EnsembleResult]:
+    """
+    run_ensemble for RVEs of increasing size at constant point density.
+
+    width x height is the cell of point_counts[0], larger counts scale both sides by
+    sqrt(count / point_counts[0]). With size_tolerance the study stops once the mean D of a size
+    differs from the previous one by less than size_tolerance of its largest entry. One process
+    pool serves all sizes.
+    """
+    scales = [math.sqrt(num_points / point_counts[0]) for num_points in point_counts]
+    sizes = [(width * scale, height * scale, num_points) for scale, num_points in zip(scales, point_counts)]
+    _check_arguments(fit, method, min_samples, sizes, point_radius)
+    batch = batch or max(workers, 1)
+    pool = Pool(workers) if workers > 1 else None
+
+    results = []
+    try:
+        for num_points, scale in zip(point_counts, scales):
+            result = _run_ensemble(
+                pool, width * scale, height * scale, num_points, point_radius, tolerance, confidence,
+                min_samples, max_samples, batch, seed, E, thickness, fit, method, verbose,
+            )
+            results.append(result)
+
+            if size_tolerance is not None and len(results) > 1:
+                change = np.abs(result.mean - results[-2].mean).max() / np.abs(result.mean).max()
+                if change <= size_tolerance:
+                    break
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RVE size study of random periodic Voronoi cells")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes, 1 runs serially")
+    parser.add_argument("--counts", type=int, nargs="+", default=[50, 100, 200, 400, 800], help="points per RVE")
+    parser.add_argument("--radius", type=float, default=0.03, help="Poisson-disk point radius")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="relative CI half width to stop sampling at")
+    parser.add_argument("--size-tolerance", type=float, default=None, help="relative change of D to stop growing at")
+    parser.add_argument("--max-samples", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = rve_size_study(
+        args.counts,
+        1.0,
+        1.0,
+        args.radius,
+        size_tolerance=args.size_tolerance,
+        tolerance=args.tolerance,
+        max_samples=args.max_samples,
+        workers=args.workers,
+        seed=args.seed,
+    )
+
+    for result in results:
+        parameters = " ".join(
+            f"{name} = {mean:.3e} ± {half_width:.1e}"
+            for name, mean, half_width in zip(result.parameter_names, result.parameter_mean, result.parameter_half_width)
+        )
+        print(f"{result.num_points:6d} points | {result.samples:4d} samples | converged: {result.converged} | {parameters}")
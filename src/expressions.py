@@ -0,0 +1,154 @@
+import math
+import re
+from functools import lru_cache
+from typing import Union
+
+# number of distinct coordinate expressions remembered by parse_expression
+EXPRESSION_CACHE_SIZE = 65536
+
+_NUMBER = r"(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+_PLAIN_NUMBER = re.compile(r"\s*([+-]?" + _NUMBER + r")\s*")
+_FRACTION = re.compile(r"\s*([+-]?" + _NUMBER + r")\s*/\s*(" + _NUMBER + r")\s*")
+_TOKEN = re.compile(r"\s*(?:(" + _NUMBER + r")|(\*\*|[-+*/()]))")
+_INTEGER = re.compile(r"[+-]?\d+")
+
+
+def _number(text: str) -> Union[int, float]:
+    # integer literals stay int so results are bit for bit the ones eval() gave
+    return int(text) if _INTEGER.fullmatch(text) else float(text)
+
+
+def _tokenize(text: str) -> list[str]:
+    tokens = []
+    position = 0
+    end = len(text.rstrip())
+    while position < end:
+        match = _TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Invalid coordinate expression {text!r}: unexpected {text[position:].strip()[:10]!r}")
+        tokens.append(match.group(1) or match.group(2))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent over the coordinate grammar, evaluated while parsing:
+
+        expression := term (("+" | "-") term)*
+        term       := unary (("*" | "/") unary)*
+        unary      := ("+" | "-") unary | power
+        power      := atom ("**" unary)?
+        atom       := number | "(" expression ")"
+
+    Precedence and associativity follow Python, so every accepted expression has the value eval()
+    gives it (powers are always evaluated as floats).
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.position = 0
+
+    def error(self, message: str) -> ValueError:
+        return ValueError(f"Invalid coordinate expression {self.text!r}: {message}")
+
+    def peek(self) -> str:
+        return self.tokens[self.position] if self.position < len(self.tokens) else ""
+
+    def take(self) -> str:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self) -> Union[int, float]:
+        if not self.tokens:
+            raise self.error("empty")
+        value = self.expression()
+        if self.position != len(self.tokens):
+            raise self.error(f"unexpected {self.peek()!r}")
+        return value
+
+    def expression(self):
+        value = self.term()
+        while self.peek() in ("+", "-"):
+            if self.take() == "+":
+                value = value + self.term()
+            else:
+                value = value - self.term()
+        return value
+
+    def term(self):
+        value = self.unary()
+        while self.peek() in ("*", "/"):
+            if self.take() == "*":
+                value = value * self.unary()
+            else:
+                value = value / self.unary()
+        return value
+
+    def unary(self):
+        if self.peek() == "+":
+            self.take()
+            return +self.unary()
+        if self.peek() == "-":
+            self.take()
+            return -self.unary()
+        return self.power()
+
+    def power(self):
+        value = self.atom()
+        if self.peek() == "**":
+            self.take()
+            # in floating point, an integer power like 9**9**9 from a hostile file would never finish
+            value = float(value) ** self.unary()
+        return value
+
+    def atom(self):
+        token = self.take()
+        if token == "(":
+            value = self.expression()
+            if self.take() != ")":
+                raise self.error("missing ')'")
+            return value
+        if token and (token[0].isdigit() or token[0] == "."):
+            return _number(token)
+        raise self.error(f"unexpected {token!r}" if token else "unexpected end")
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def _parse_text(text: str) -> Union[int, float]:
+    # plain numbers and fractions are by far the most common, they skip the parser
+    plain = _PLAIN_NUMBER.fullmatch(text)
+    if plain is not None:
+        return _number(plain.group(1))
+    fraction = _FRACTION.fullmatch(text)
+    if fraction is not None:
+        return _number(fraction.group(1)) / _number(fraction.group(2))
+    return _Parser(text).parse()
+
+
+def parse_expression(expression: Union[str, int, float]) -> Union[int, float]:
+    """
+    Value of a coordinate expression of the input schema, e.g. "0.02", "-4/3" or "(1 + 2) / 3".
+
+    Only numbers, + - * / ** and parentheses are accepted, anything else raises ValueError, as do
+    expressions that can't be evaluated to a finite real number (division by zero, overflow, too
+    deep nesting, roots of negative numbers); numbers given as JSON numbers are passed through.
+    Repeated expressions are looked up in a cache instead of being parsed again.
+    """
+    if isinstance(expression, (int, float)) and not isinstance(expression, bool):
+        return expression
+    if not isinstance(expression, str):
+        raise ValueError(f"Invalid coordinate expression {expression!r}: expected a string or a number")
+    try:
+        value = _parse_text(expression)
+    except ZeroDivisionError:
+        raise ValueError(f"Invalid coordinate expression {expression!r}: division by zero") from None
+    except OverflowError:
+        raise ValueError(f"Invalid coordinate expression {expression!r}: result too large") from None
+    except RecursionError:
+        raise ValueError(f"Invalid coordinate expression {expression!r}: nested too deeply") from None
+    if not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"Invalid coordinate expression {expression!r}: {value!r} is not a finite real number")
+    return value
@@ -1,6 +1,13 @@
 import math
+from typing import Dict, Optional
 
+import numpy as np
+
+from models import TrussData
 from structure_parser import EigenstrainDefinition, ElementDefinition, NodeDefinition, StructureDefinition, MasterDefinition, DependencyDefinition
+from structure_parser import structure_from_arrays, truss_from_arrays
+
+GRID_DIAGONALS = ("none", "single", "cross")
 
 
 def create_cantilever_beam(length: float, height: float, nx: int, ny: int,
@@ -203,4 +210,104 @@ def create_tie_structure_angle(height: float, width: float, angle: float) -> Str
         dependencies=dependencies,
         eigenstrain=EigenstrainDefinition(x=1.0, y=0.0, angle=1.0),
     )
-    
\ No newline at end of file
+    
+
+
+def periodic_grid_arrays(
+        nx: int,
+        ny: int,
+        width: float,
+        height: float,
+        diagonals: str = "single",
+        default_E: float = 210e6,
+        default_A: float = 0.000001,
+) -> Dict[str, np.ndarray]:
+    """
+    Periodic nx x ny grid lattice of a width x height cell as structure_arrays style arrays,
+    built without per-node Python loops.
+
+    Nodes are laid out like data/grid.json, node (i, j) = j * (nx + 1) + i. The right column and the
+    top row are images of the left column and the bottom row and depend on them in x and y (the
+    corners on node 0), so every member of the periodic lattice is present exactly once. diagonals
+    adds one ("single", from (i, j) to (i + 1, j + 1)) or both ("cross") diagonals of every cell.
+    Node 0 is fixed against rigid translation.
+    """
+    if diagonals not in GRID_DIAGONALS:
+        raise ValueError(f"Unknown diagonals '{diagonals}', expected one of {GRID_DIAGONALS}")
+    if nx < 1 or ny < 1:
+        raise ValueError("A periodic grid needs at least one cell in each direction")
+
+    columns = nx + 1
+    node_ids = np.arange(columns * (ny + 1)).reshape(ny + 1, columns)
+
+    xs = np.linspace(0.0, width, columns)
+    ys = np.linspace(0.0, height, ny + 1)
+    coords = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+    # the top row and the right column hold images only, their members are the bottom row's and left column's
+    member_groups = [
+        np.column_stack([node_ids[:ny, :nx].ravel(), node_ids[:ny, 1:].ravel()]),  # horizontal
+        np.column_stack([node_ids[:ny, :nx].ravel(), node_ids[1:, :nx].ravel()]),  # vertical
+    ]
+    if diagonals in ("single", "cross"):
+        member_groups.append(np.column_stack([node_ids[:ny, :nx].ravel(), node_ids[1:, 1:].ravel()]))
+    if diagonals == "cross":
+        member_groups.append(np.column_stack([node_ids[:ny, 1:].ravel(), node_ids[1:, :nx].ravel()]))
+    connectivity = np.concatenate(member_groups).astype(np.int64)
+
+    # images and the nodes they repeat, the corner (nx, ny) repeats node 0 like the other corners
+    dependents = np.concatenate([node_ids[:, nx], node_ids[ny, :nx]])
+    masters = np.concatenate([node_ids[:ny, 0], [0], node_ids[0, :nx]])
+
+    node_count = len(coords)
+    constrained = np.zeros((node_count, 2), dtype=bool)
+    constrained[0] = True
+
+    directions = np.array([0, 1])
+    return {
+        "coords": coords,
+        "connectivity": connectivity,
+        "E": np.full(len(connectivity), default_E, dtype=float),
+        "A": np.full(len(connectivity), default_A, dtype=float),
+        "constrained": constrained,
+        "deformations": np.zeros((node_count, 2)),
+        "loads": np.zeros((node_count, 2)),
+        "dependent_dof": (dependents[:, np.newaxis] * 2 + directions).ravel(),
+        "master_dof": (masters[:, np.newaxis] * 2 + directions).ravel(),
+        "master_factor": np.ones(len(dependents) * 2),
+        "master_eigenstrain": np.ones(len(dependents) * 2, dtype=bool),
+    }
+
+
+def create_periodic_grid(
+        nx: int,
+        ny: int,
+        width: float,
+        height: float,
+        diagonals: str = "single",
+        default_E: float = 210e6,
+        default_A: float = 0.000001,
+) -> StructureDefinition:
+    """Periodic grid lattice as a StructureDefinition, see periodic_grid_arrays."""
+    arrays = periodic_grid_arrays(nx, ny, width, height, diagonals, default_E, default_A)
+    return structure_from_arrays(arrays, volume=width * height)
+
+
+def create_periodic_grid_truss(
+        nx: int,
+        ny: int,
+        width: float,
+        height: float,
+        diagonals: str = "single",
+        default_E: float = 210e6,
+        default_A: float = 0.000001,
+        eigenstrain_vector: Optional[np.ndarray] = None,
+) -> TrussData:
+    """
+    Solver-ready periodic grid lattice straight from the arrays, the fast path for large grids
+    where building definition objects would dominate.
+    """
+    if eigenstrain_vector is None:
+        eigenstrain_vector = np.zeros(3)
+    arrays = periodic_grid_arrays(nx, ny, width, height, diagonals, default_E, default_A)
+    return truss_from_arrays(arrays, width * height, eigenstrain_vector)
@@ -0,0 +1,149 @@
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from scipy.sparse import issparse
+
+
+@dataclass
+class PhaseStats:
+    """Wall time, traced peak memory and problem sizes of one solver phase."""
+    name: str
+    seconds: float = 0.0
+    # peak of the memory allocated during the phase (tracemalloc), None when memory is not traced;
+    # only allocations made through Python (numpy arrays included) are seen, not SuperLU/LAPACK workspaces
+    peak_bytes: Optional[int] = None
+    sizes: Dict[str, int] = field(default_factory=dict)
+
+    def count(self, name: str, value: int):
+        self.sizes[name] = int(value)
+
+    def matrix(self, name: str, matrix):
+        """Record rows, columns and stored entries (nnz; all entries for a dense matrix) of a matrix."""
+        rows, cols = matrix.shape
+        self.sizes[f"{name}_rows"] = int(rows)
+        self.sizes[f"{name}_cols"] = int(cols)
+        self.sizes[f"{name}_nnz"] = int(matrix.nnz if issparse(matrix) else np.size(matrix))
+
+
+@dataclass
+class SolveStats:
+    """Phases of one solve in the order they ran, attached to the solver as stats."""
+    phases: List[PhaseStats] = field(default_factory=list)
+
+    def __getitem__(self, name: str) -> PhaseStats:
+        for phase in self.phases:
+            if phase.name == name:
+                return phase
+        raise KeyError(name)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(phase.seconds for phase in self.phases)
+
+    @property
+    def peak_bytes(self) -> Optional[int]:
+        peaks = [phase.peak_bytes for phase in self.phases if phase.peak_bytes is not None]
+        return max(peaks) if peaks else None
+
+    def as_dict(self) -> dict:
+        """Plain dict (JSON serializable) for logs and dashboards."""
+        return {"total_seconds": self.total_seconds, "phases": [asdict(phase) for phase in self.phases]}
+
+    def __str__(self) -> str:
+        lines = []
+        for phase in self.phases:
+            memory = "" if phase.peak_bytes is None else f" | peak {phase.peak_bytes / 2**20:8.2f} MiB"
+            sizes = " ".join(f"{name}={value}" for name, value in phase.sizes.items())
+            lines.append(f"{phase.name:<14} {phase.seconds * 1e3:10.3f} ms{memory} | {sizes}")
+        lines.append(f"{'total':<14} {self.total_seconds * 1e3:10.3f} ms")
+        return "\n".join(lines)
+
+
+class _NullPhase:
+    # stands in for PhaseStats when recording is off, every call is a no-op
+
+    def count(self, name: str, value: int):
+        pass
+
+    def matrix(self, name: str, matrix):
+        pass
+
+    def __enter__(self) -> "_NullPhase":
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+
+    def __init__(self, recorder: "PhaseRecorder", name: str):
+        self.recorder = recorder
+        self.stats = PhaseStats(name)
+
+    def __enter__(self) -> PhaseStats:
+        if self.recorder.trace_memory:
+            tracemalloc.reset_peak()
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        self.stats.seconds = time.perf_counter() - self.start
+        if self.recorder.trace_memory:
+            self.stats.peak_bytes = tracemalloc.get_traced_memory()[1] - self.start_memory
+        self.recorder.stats.phases.append(self.stats)
+        if self.recorder.on_phase is not None:
+            self.recorder.on_phase(self.stats)
+        return False
+
+
+class PhaseRecorder:
+    """
+    Collects PhaseStats of consecutive phases into stats:
+
+        with recorder.phase("assembly") as phase:
+            K = ...
+            phase.matrix("K", K)
+
+    A disabled recorder hands out one shared no-op phase, so instrumented code costs a method call
+    per phase and nothing else. With trace_memory tracemalloc is started by start() (unless it is
+    already running) and stopped again by stop(); tracing slows allocations down considerably,
+    only the timings of runs without it are representative. on_phase is called with every finished
+    phase, e.g. to stream them to a dashboard.
+    """
+
+    def __init__(
+            self,
+            enabled: bool = False,
+            trace_memory: bool = False,
+            on_phase: Optional[Callable[[PhaseStats], None]] = None,
+    ):
+        self.enabled = enabled or trace_memory
+        self.trace_memory = trace_memory
+        self.on_phase = on_phase
+        self.stats = SolveStats()
+        self._started_tracing = False
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def start(self):
+        self.stats = SolveStats()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self) -> SolveStats:
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return self.stats
@@ -0,0 +1,183 @@
+import time
+import warnings
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.linalg import LinearOperator, cg, spilu, splu
+
+PRECONDITIONERS = ("none", "jacobi", "ilu")
+
+
+@dataclass
+class IterativeSolveInfo:
+    """Convergence report of a preconditioned CG solve, one entry per right-hand side."""
+    preconditioner: str
+    tolerance: float
+    max_iterations: Optional[int]
+    iterations: List[int] = field(default_factory=list)
+    residuals: List[float] = field(default_factory=list)  # relative residual norms ||b - Ax|| / ||b||
+    converged: List[bool] = field(default_factory=list)
+    setup_time: float = 0.0  # preconditioner construction [s]
+    solve_time: float = 0.0  # CG iterations of all right-hand sides [s]
+
+
+def block_diagonal(blocks: np.ndarray) -> csr_matrix:
+    """Sparse block diagonal matrix of the element 4x4 blocks (element data, not the global K)."""
+    local_dofs = np.arange(blocks.shape[0] * 4).reshape(-1, 4)
+    rows = np.repeat(local_dofs, 4, axis=1).ravel()
+    cols = np.tile(local_dofs, (1, 4)).ravel()
+    size = blocks.shape[0] * 4
+    return coo_matrix((blocks.ravel(), (rows, cols)), shape=(size, size)).tocsr()
+
+
+class ElementOperator(LinearOperator):
+    """
+    Reduced stiffness T^T K T applied element by element, without assembling K.
+
+    blocks are the element stiffness matrices (m, 4, 4) and dofs their global DOFs (m, 4).
+    free_transformation maps the free DOFs to all global DOFs (global order), so
+    gather = free_transformation[dofs] takes free DOF values straight to element DOF values.
+    """
+
+    def __init__(self, blocks: np.ndarray, dofs: np.ndarray, free_transformation: csr_matrix):
+        self.blocks = blocks
+        self.element_count = blocks.shape[0]
+        self.gather = free_transformation[dofs.ravel()].tocsr()
+        self.scatter = self.gather.T.tocsr()
+        size = free_transformation.shape[1]
+        super().__init__(dtype=blocks.dtype, shape=(size, size))
+
+    def _matvec(self, x: np.ndarray) -> np.ndarray:
+        element_values = (self.gather @ np.ravel(x)).reshape(self.element_count, 4)
+        element_forces = np.einsum("eij,ej->ei", self.blocks, element_values)
+        return self.scatter @ element_forces.ravel()
+
+    def _rmatvec(self, x: np.ndarray) -> np.ndarray:
+        # the operator is symmetric
+        return self._matvec(x)
+
+    def diagonal(self) -> np.ndarray:
+        """Exact diagonal of T^T K T, sum over elements of diag(G_e^T K_e G_e)."""
+        weighted = block_diagonal(self.blocks) @ self.gather
+        return np.asarray(self.gather.multiply(weighted).sum(axis=0)).ravel()
+
+    def assemble(self) -> csr_matrix:
+        """Explicit reduced matrix, only needed by factorization based preconditioners."""
+        return (self.scatter @ block_diagonal(self.blocks) @ self.gather).tocsr()
+
+
+def build_preconditioner(
+        operator: ElementOperator,
+        kind: str = "jacobi",
+        drop_tol: float = 1e-4,
+        fill_factor: float = 10,
+) -> Optional[LinearOperator]:
+    """
+    Symmetric positive definite preconditioner for CG on the reduced operator, None for "none".
+
+    "jacobi" is the exact inverse diagonal, "ilu" a symmetrized incomplete LDL^T of the assembled
+    reduced matrix (drop_tol / fill_factor as for scipy's spilu).
+    """
+    if kind == "none":
+        return None
+
+    if kind == "jacobi":
+        inverse_diagonal = 1 / operator.diagonal()
+        return LinearOperator(
+            operator.shape,
+            matvec=lambda x: inverse_diagonal * np.ravel(x),
+            dtype=operator.dtype,
+        )
+
+    if kind == "ilu":
+        # incomplete factorization of the reduced matrix; this is the only path that materializes it.
+        # CG needs a symmetric positive definite M, which the plain L U is not: with a symmetric
+        # ordering and no pivoting P A P^T ~ L U, and M = P^T L D L^T P with D = |diag(U)| is used
+        factorization = spilu(
+            operator.assemble().tocsc(),
+            drop_tol=drop_tol,
+            fill_factor=fill_factor,
+            permc_spec="MMD_AT_PLUS_A",
+            diag_pivot_thresh=0,
+            options=dict(SymmetricMode=True),
+        )
+        permutation = factorization.perm_c
+        if not np.array_equal(factorization.perm_r, permutation):
+            raise RuntimeError("Incomplete factorization pivoted rows, it can't be symmetrized for CG")
+
+        diagonal = np.abs(factorization.U.diagonal())
+        diagonal[diagonal == 0] = 1.0
+        # L is unit lower triangular, a natural order LU of it has no fill and gives fast L^-1 / L^-T solves
+        lower = splu(
+            factorization.L.tocsc(), permc_spec="NATURAL", diag_pivot_thresh=0, options=dict(SymmetricMode=True)
+        )
+
+        def solve(x):
+            permuted = np.empty(operator.shape[0])
+            permuted[permutation] = np.ravel(x)
+            return lower.solve(lower.solve(permuted) / diagonal, trans="T")[permutation]
+
+        return LinearOperator(operator.shape, matvec=solve, dtype=operator.dtype)
+
+    raise ValueError(f"Unknown preconditioner '{kind}', expected one of {PRECONDITIONERS}")
+
+
+def solve_cg(
+        operator: LinearOperator,
+        rhs: np.ndarray,
+        preconditioner: str = "jacobi",
+        tolerance: float = 1e-10,
+        max_iterations: Optional[int] = None,
+) -> tuple[np.ndarray, IterativeSolveInfo]:
+    """
+    Solve operator @ x = rhs with preconditioned conjugate gradients for every column of rhs.
+
+    The preconditioner is built once and shared by all columns. Columns that do not reach the
+    tolerance within max_iterations are reported in the returned info and with a RuntimeWarning.
+    """
+    start = time.perf_counter()
+    M = build_preconditioner(operator, preconditioner)
+    info = IterativeSolveInfo(preconditioner=preconditioner, tolerance=tolerance, max_iterations=max_iterations)
+    info.setup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    rhs = np.asarray(rhs, dtype=float).reshape(operator.shape[0], -1)
+    solution = np.zeros_like(rhs)
+
+    for column in range(rhs.shape[1]):
+        b = rhs[:, column]
+        b_norm = np.linalg.norm(b)
+        if b_norm == 0:
+            info.iterations.append(0)
+            info.residuals.append(0.0)
+            info.converged.append(True)
+            continue
+
+        iterations = 0
+
+        def count(_):
+            nonlocal iterations
+            iterations += 1
+
+        x, status = cg(operator, b, rtol=tolerance, atol=0.0, maxiter=max_iterations, M=M, callback=count)
+        solution[:, column] = x
+
+        info.iterations.append(iterations)
+        info.residuals.append(float(np.linalg.norm(b - operator @ x) / b_norm))
+        info.converged.append(status == 0)
+
+    info.solve_time = time.perf_counter() - start
+
+    if not all(info.converged):
+        failed = [column for column, converged in enumerate(info.converged) if not converged]
+        warnings.warn(
+            f"CG did not reach the tolerance {tolerance:g} within {max_iterations} iterations for "
+            f"right-hand sides {failed} (relative residuals {[info.residuals[column] for column in failed]})",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+
+    return solution, info
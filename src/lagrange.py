@@ -26,15 +26,11 @@ eigenstrainSets = [
     np.array([0, 0, 1]),
 ]
 
-results = []
-
-for eigenstrain in eigenstrainSets:
-    truss: TrussData = parse_json_file('./data/grid.json', explicitEigenStrain=eigenstrain)
-    solver = LagrangeTrussSolver(truss)
-    res = solver.solve()
-    results.append(res)
+# one parse and one KKT factorization serve all three eigenstrain cases
+solver = LagrangeTrussSolver(truss)
+Ds = solver.solve_macro_strains(np.array(eigenstrainSets))
 
-Ds = np.array(results).T
+print(colored(f"Lambdas for all cases:\n{solver.lambdas}\n", "light_yellow"))
 
 print(colored(f"D matrix from lagrange solver:\n{Ds}\n", "cyan"))
 
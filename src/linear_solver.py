@@ -0,0 +1,143 @@
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from scipy.linalg import LinAlgError, cho_factor, cho_solve, lu_factor, lu_solve
+from scipy.sparse import spmatrix
+from scipy.sparse.linalg import splu
+
+# reduced systems up to this many DOFs are factorized densely with LAPACK
+DENSE_THRESHOLD = 1500
+# reduced systems above this many DOFs are solved with matrix-free preconditioned CG
+ITERATIVE_THRESHOLD = 400_000
+
+BACKENDS = ("auto", "dense", "sparse", "cg")
+
+
+@dataclass
+class BackendInfo:
+    """Which linear solver handled a system and how long it took, for tuning the thresholds."""
+    backend: str  # "dense", "sparse" or "cg"
+    method: str  # "cholesky", "lu", "superlu" or the CG preconditioner
+    size: int
+    nnz: int  # stored entries of the factorized matrix, 0 if it was never assembled
+    setup_time: float  # factorization or preconditioner construction [s]
+    solve_time: float  # forward/backward substitution or CG iterations [s]
+
+
+def select_backend(
+        size: int,
+        dense_threshold: int = DENSE_THRESHOLD,
+        iterative_threshold: int = ITERATIVE_THRESHOLD,
+) -> str:
+    """Pick a backend for a reduced system of the given size."""
+    if size <= dense_threshold:
+        return "dense"
+    if size > iterative_threshold:
+        return "cg"
+    return "sparse"
+
+
+class DenseSolver:
+    """LAPACK Cholesky of the densified matrix, falling back to LU if it is not positive definite."""
+    name = "dense"
+
+    def __init__(self, positive_definite: bool = True):
+        self.method = "cholesky" if positive_definite else "lu"
+        self._factorization = None
+
+    def factorize(self, matrix: spmatrix) -> None:
+        dense = matrix.toarray()
+        if self.method == "cholesky":
+            try:
+                self._factorization = cho_factor(dense)
+                return
+            except LinAlgError:
+                self.method = "lu"
+        self._factorization = lu_factor(dense)
+
+    def solve(self, rhs: np.ndarray) -> np.ndarray:
+        if self.method == "cholesky":
+            return cho_solve(self._factorization, rhs)
+        return lu_solve(self._factorization, rhs)
+
+
+class SparseDirectSolver:
+    """
+    SuperLU sparse direct factorization.
+
+    A symmetric positive definite matrix is ordered symmetrically (minimum degree on A^T + A) with
+    diagonal pivots preferred, which roughly halves fill and factorization time against the default
+    COLAMD column ordering on stiffness matrices; other matrices keep COLAMD with partial pivoting.
+    """
+    name = "sparse"
+    method = "superlu"
+
+    def __init__(self, positive_definite: bool = True):
+        self.positive_definite = positive_definite
+        self._factorization = None
+
+    def factorize(self, matrix: spmatrix) -> None:
+        if self.positive_definite:
+            self._factorization = splu(
+                matrix.tocsc(), permc_spec="MMD_AT_PLUS_A", options=dict(SymmetricMode=True)
+            )
+        else:
+            self._factorization = splu(matrix.tocsc())
+
+    def solve(self, rhs: np.ndarray) -> np.ndarray:
+        return self._factorization.solve(rhs)
+
+
+DIRECT_SOLVERS = {
+    DenseSolver.name: DenseSolver,
+    SparseDirectSolver.name: SparseDirectSolver,
+}
+
+
+def solve_direct(
+        backend: str,
+        matrix: spmatrix,
+        rhs: np.ndarray,
+        positive_definite: bool = True,
+) -> tuple[np.ndarray, BackendInfo]:
+    """Factorize matrix once with the given direct backend and solve all columns of rhs."""
+    if backend not in DIRECT_SOLVERS:
+        raise ValueError(f"Unknown direct backend '{backend}', expected one of {tuple(DIRECT_SOLVERS)}")
+
+    solver = DIRECT_SOLVERS[backend](positive_definite)
+
+    start = time.perf_counter()
+    solver.factorize(matrix)
+    factorized = time.perf_counter()
+    solution = solver.solve(rhs)
+    solved = time.perf_counter()
+
+    info = BackendInfo(
+        backend=backend,
+        method=solver.method,
+        size=matrix.shape[0],
+        nnz=matrix.nnz,
+        setup_time=factorized - start,
+        solve_time=solved - factorized,
+    )
+    return solution, info
+
+
+def resolve_backend(
+        backend: str,
+        size: int,
+        dense_threshold: Optional[int] = None,
+        iterative_threshold: Optional[int] = None,
+) -> str:
+    """Turn a requested backend ("auto" included) into the concrete one to use."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend != "auto":
+        return backend
+    return select_backend(
+        size,
+        DENSE_THRESHOLD if dense_threshold is None else dense_threshold,
+        ITERATIVE_THRESHOLD if iterative_threshold is None else iterative_threshold,
+    )
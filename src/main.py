@@ -24,7 +24,7 @@ solver = TrussSolver(truss)
 
 res = solver.solve()
 
-export_vtk(truss)
+export_vtk(truss, solver.displacements, solver.axial_forces)
 
 exit(0)
 
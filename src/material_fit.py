@@ -0,0 +1,279 @@
+import warnings
+
+import numpy as np
+
+FIT_METHODS = ("least_squares", "compliance")
+
+# relative cost reduction / parameter step at which a least squares fit counts as converged
+FIT_TOLERANCE = 1e-10
+FIT_MAX_ITERATIONS = 100
+
+# parameters (E, v), E in Pa, v dimensionless
+ISO_INITIAL_GUESS = np.array([210e6, 0.4])
+ISO_BOUNDS = (np.array([1e2, 0]), np.array([1e12, 0.5]))
+
+# parameters (Ex, Ey, vxy, vyx, Gxy)
+ORTO_INITIAL_GUESS = np.array([210e6, 210e6, 0.4, 0.4, 21e6])
+ORTO_BOUNDS = (np.array([1e2, 1e2, -1, -1, 0]), np.array([1e12, 1e12, 0.5, 0.5, 1e12]))
+
+
+def iso_D(params: np.ndarray) -> np.ndarray:
+    """Isotropic plane stress D of every parameter row (E, v), shape (..., 3, 3)."""
+    params = np.asarray(params, dtype=float)
+    E, v = params[..., 0], params[..., 1]
+    factor = E / (1 - v**2)
+
+    D = np.zeros(params.shape[:-1] + (3, 3))
+    D[..., 0, 0] = factor
+    D[..., 1, 1] = factor
+    D[..., 0, 1] = factor * v
+    D[..., 1, 0] = factor * v
+    D[..., 2, 2] = factor * (1 - v) / 2
+    return D
+
+
+def iso_D_jacobian(params: np.ndarray) -> np.ndarray:
+    """Derivatives of iso_D with respect to (E, v), shape (..., 3, 3, 2)."""
+    params = np.asarray(params, dtype=float)
+    E, v = params[..., 0], params[..., 1]
+    denominator = 1 - v**2
+    factor = E / denominator
+    factor_v = 2 * v * E / denominator**2
+
+    J = np.zeros(params.shape[:-1] + (3, 3, 2))
+    J[..., 0, 0, 0] = 1 / denominator
+    J[..., 1, 1, 0] = 1 / denominator
+    J[..., 0, 1, 0] = v / denominator
+    J[..., 1, 0, 0] = v / denominator
+    J[..., 2, 2, 0] = (1 - v) / (2 * denominator)
+
+    J[..., 0, 0, 1] = factor_v
+    J[..., 1, 1, 1] = factor_v
+    J[..., 0, 1, 1] = factor_v * v + factor
+    J[..., 1, 0, 1] = factor_v * v + factor
+    J[..., 2, 2, 1] = factor_v * (1 - v) / 2 - factor / 2
+    return J
+
+
+def orto_D(params: np.ndarray) -> np.ndarray:
+    """Orthotropic plane stress D of every parameter row (Ex, Ey, vxy, vyx, Gxy), shape (..., 3, 3)."""
+    params = np.asarray(params, dtype=float)
+    Ex, Ey, vxy, vyx, Gxy = np.moveaxis(params, -1, 0)
+    factor = 1 / (1 - vxy * vyx)
+
+    D = np.zeros(params.shape[:-1] + (3, 3))
+    D[..., 0, 0] = factor * Ex
+    D[..., 0, 1] = factor * vyx * Ex
+    D[..., 1, 0] = factor * vxy * Ey
+    D[..., 1, 1] = factor * Ey
+    D[..., 2, 2] = Gxy
+    return D
+
+
+def orto_D_jacobian(params: np.ndarray) -> np.ndarray:
+    """Derivatives of orto_D with respect to (Ex, Ey, vxy, vyx, Gxy), shape (..., 3, 3, 5)."""
+    params = np.asarray(params, dtype=float)
+    Ex, Ey, vxy, vyx, _ = np.moveaxis(params, -1, 0)
+    factor = 1 / (1 - vxy * vyx)
+    factor_squared = factor**2  # d factor / d vxy = vyx * factor^2, d factor / d vyx = vxy * factor^2
+
+    J = np.zeros(params.shape[:-1] + (3, 3, 5))
+    J[..., 0, 0, 0] = factor
+    J[..., 0, 0, 2] = Ex * vyx * factor_squared
+    J[..., 0, 0, 3] = Ex * vxy * factor_squared
+
+    J[..., 0, 1, 0] = factor * vyx
+    J[..., 0, 1, 2] = Ex * vyx**2 * factor_squared
+    J[..., 0, 1, 3] = Ex * factor_squared
+
+    J[..., 1, 0, 1] = factor * vxy
+    J[..., 1, 0, 2] = Ey * factor_squared
+    J[..., 1, 0, 3] = Ey * vxy**2 * factor_squared
+
+    J[..., 1, 1, 1] = factor
+    J[..., 1, 1, 2] = Ey * vyx * factor_squared
+    J[..., 1, 1, 3] = Ey * vxy * factor_squared
+
+    J[..., 2, 2, 4] = 1
+    return J
+
+
+def normal_compliance(Ds: np.ndarray) -> np.ndarray:
+    """
+    Compliance of the normal 2x2 block of every D, shape (..., 2, 2); NaN where that block is singular.
+
+    Both material models have no normal/shear coupling, so the compliance is taken block by block;
+    this keeps cells without shear stiffness (a singular 3x3 D) fittable.
+    """
+    normal = np.asarray(Ds, dtype=float)[..., :2, :2]
+    determinant = normal[..., 0, 0] * normal[..., 1, 1] - normal[..., 0, 1] * normal[..., 1, 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inverse_determinant = np.where(determinant != 0, 1 / determinant, np.nan)
+
+    S = np.empty_like(normal)
+    S[..., 0, 0] = normal[..., 1, 1]
+    S[..., 1, 1] = normal[..., 0, 0]
+    S[..., 0, 1] = -normal[..., 0, 1]
+    S[..., 1, 0] = -normal[..., 1, 0]
+    return S * inverse_determinant[..., np.newaxis, np.newaxis]
+
+
+def compliance_iso(Ds: np.ndarray) -> np.ndarray:
+    """
+    Closed-form (E, v) from the compliance S of every D, shape (..., 2).
+
+    The normal compliances are averaged: E = 2 / (S00 + S11), v = -(S01 + S10) / (S00 + S11);
+    the shear term is not used.
+    """
+    S = normal_compliance(Ds)
+    normal = S[..., 0, 0] + S[..., 1, 1]
+    return np.stack([2 / normal, -(S[..., 0, 1] + S[..., 1, 0]) / normal], axis=-1)
+
+
+def compliance_orto(Ds: np.ndarray) -> np.ndarray:
+    """
+    Closed-form (Ex, Ey, vxy, vyx, Gxy) from the compliance S of every D, shape (..., 5).
+
+    Ex = 1 / S00, Ey = 1 / S11, vxy = -S10 / S00, vyx = -S01 / S11 and Gxy = 1 / S22 = D22;
+    exact for any D of the orto_D form, no bounds are applied.
+    """
+    Ds = np.asarray(Ds, dtype=float)
+    S = normal_compliance(Ds)
+    return np.stack([
+        1 / S[..., 0, 0],
+        1 / S[..., 1, 1],
+        -S[..., 1, 0] / S[..., 0, 0],
+        -S[..., 0, 1] / S[..., 1, 1],
+        Ds[..., 2, 2],
+    ], axis=-1)
+
+
+def least_squares_fit(
+        Ds: np.ndarray,
+        model,
+        model_jacobian,
+        initial_guess: np.ndarray,
+        bounds: tuple[np.ndarray, np.ndarray],
+        tolerance: float = FIT_TOLERANCE,
+        max_iterations: int = FIT_MAX_ITERATIONS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bounded least squares fit of model(params) to every D of a stack, with an analytic Jacobian.
+
+    All fits are solved together by one vectorized Levenberg-Marquardt iteration (steps projected
+    onto the bounds). Every D has its own damping and its own convergence check, on the relative
+    cost reduction and step, and is frozen once converged; a fit therefore does not depend on which
+    other D share the stack. The residuals of each D are normalized by its norm, so every fit
+    contributes on the same cost scale.
+    initial_guess is either one parameter row shared by all fits or one row per D. D with
+    non-finite entries give NaN parameters, fits not converged after max_iterations are reported
+    with a RuntimeWarning. Returns the parameters (fits, k) and the final cost of every fit (fits,).
+    """
+    Ds = np.asarray(Ds, dtype=float).reshape(-1, 3, 3)
+    count = len(Ds)
+    parameter_count = len(bounds[0])
+    lower, upper = bounds
+
+    # add small value to avoid division by zero
+    scale = 1 / (np.linalg.norm(Ds, axis=(1, 2)) + 1e-10)
+
+    def costs_of(params, fits):
+        residuals = (model(params) - Ds[fits]) * scale[fits, np.newaxis, np.newaxis]
+        return 0.5 * np.sum(residuals.reshape(-1, 9) ** 2, axis=1)
+
+    params = np.clip(np.broadcast_to(initial_guess, (count, parameter_count)), lower, upper)
+    costs = costs_of(params, np.arange(count))
+    finite = np.isfinite(costs)
+    params[~finite] = np.nan
+
+    damping = np.full(count, 1e-3)
+    active = finite.copy()
+    for _ in range(max_iterations):
+        fits = np.flatnonzero(active)
+        if len(fits) == 0:
+            break
+
+        x = params[fits]
+        residuals = ((model(x) - Ds[fits]) * scale[fits, np.newaxis, np.newaxis]).reshape(-1, 9)
+        J = model_jacobian(x).reshape(-1, 9, parameter_count) * scale[fits, np.newaxis, np.newaxis]
+        gradient = np.einsum("frk,fr->fk", J, residuals)
+
+        # parameters held at a bound by the gradient are left out of the step
+        blocked = ((x <= lower) & (gradient > 0)) | ((x >= upper) & (gradient < 0))
+        J = np.where(blocked[:, np.newaxis, :], 0.0, J)
+        gradient = np.where(blocked, 0.0, gradient)
+        H = np.einsum("frk,frl->fkl", J, J)
+
+        # Marquardt scaling by diag(H) makes the damping independent of the parameter units (Pa vs. 1)
+        diagonal = np.maximum(np.diagonal(H, axis1=1, axis2=2), np.finfo(float).tiny)
+        H[:, np.arange(parameter_count), np.arange(parameter_count)] += damping[fits, np.newaxis] * diagonal
+        step = -np.linalg.solve(H, gradient[..., np.newaxis])[..., 0]
+
+        trial = np.clip(x + step, lower, upper)
+        # a trial on a singular point of the model (e.g. vxy * vyx = 1 at the orto bounds) is just rejected
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trial_costs = costs_of(trial, fits)
+        improved = trial_costs < costs[fits]
+
+        small_step = np.all(np.abs(trial - x) <= tolerance * (np.abs(x) + tolerance), axis=1)
+        small_reduction = costs[fits] - trial_costs <= tolerance * costs[fits]
+
+        params[fits] = np.where(improved[:, np.newaxis], trial, x)
+        costs[fits] = np.where(improved, trial_costs, costs[fits])
+        damping[fits] = np.where(improved, np.maximum(damping[fits] / 10, 1e-12), damping[fits] * 10)
+        active[fits] = ~(small_step | (improved & small_reduction))
+
+    if active.any():
+        warnings.warn(
+            f"{np.count_nonzero(active)} of {count} least squares fits did not converge within "
+            f"{max_iterations} iterations",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+
+    return params, costs
+
+
+def _initial_guess(Ds: np.ndarray, closed_form, default: np.ndarray) -> np.ndarray:
+    """Closed-form start of a least squares fit, the default guess where it is not finite."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        params = closed_form(Ds.reshape(-1, 3, 3))
+    return np.where(np.isfinite(params), params, default)
+
+
+def fit_iso(Ds: np.ndarray, method: str = "least_squares") -> np.ndarray:
+    """
+    Fit isotropic (E, v) to a D matrix or a stack of them, shape (..., 2).
+
+    "compliance" is the closed form of compliance_iso, "least_squares" a bounded fit started
+    from it and clipped to ISO_BOUNDS.
+    """
+    Ds = np.asarray(Ds, dtype=float)
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method '{method}', expected one of {FIT_METHODS}")
+
+    if method == "compliance":
+        return compliance_iso(Ds)
+
+    initial_guess = _initial_guess(Ds, compliance_iso, ISO_INITIAL_GUESS)
+    params, _ = least_squares_fit(Ds, iso_D, iso_D_jacobian, initial_guess, ISO_BOUNDS)
+    return params.reshape(Ds.shape[:-2] + (2,))
+
+
+def fit_orto(Ds: np.ndarray, method: str = "least_squares") -> np.ndarray:
+    """
+    Fit orthotropic (Ex, Ey, vxy, vyx, Gxy) to a D matrix or a stack of them, shape (..., 5).
+
+    "compliance" is the closed form of compliance_orto, "least_squares" a bounded fit started
+    from it and clipped to ORTO_BOUNDS.
+    """
+    Ds = np.asarray(Ds, dtype=float)
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method '{method}', expected one of {FIT_METHODS}")
+
+    if method == "compliance":
+        return compliance_orto(Ds)
+
+    initial_guess = _initial_guess(Ds, compliance_orto, ORTO_INITIAL_GUESS)
+    params, _ = least_squares_fit(Ds, orto_D, orto_D_jacobian, initial_guess, ORTO_BOUNDS)
+    return params.reshape(Ds.shape[:-2] + (5,))
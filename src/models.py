@@ -1,8 +1,11 @@
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import List, Optional
-from scipy.sparse import csc_array
+from scipy.sparse import csc_array, csr_matrix
 import numpy as np
 
+from eigenstrain import eigenstrain_operator, macro_strain_coefficients
+
 
 @dataclass
 class Node:
@@ -138,7 +141,159 @@ class Element:
 
 @dataclass
 class TrussData:
-    nodes: List[Node]
-    elements: List[Element]
+    """
+    Array-backed truss.
+
+    Nodes and elements are stored as flat arrays that the solvers use directly.
+    Master relations are stored one entry per master: u[dependent_dof] depends on
+    master_factor * u[master_dof], master_eigenstrain tells whether the relation
+    carries an eigenstrain offset. The nodes/elements properties build the old
+    Node/Element object view lazily for scripts that still want it; it is a snapshot,
+    changes made to those objects are not seen by the solvers.
+    """
+    coords: np.ndarray  # (nodes, 2) node positions dx, dy
+    connectivity: np.ndarray  # (elements, 2) starting and ending node
+    E: np.ndarray  # (elements,)
+    A: np.ndarray  # (elements,)
+    constrained: np.ndarray  # (nodes, 2) bool, fixed x / y
+    deformations: np.ndarray  # (nodes, 2) prescribed deformations
+    loads: np.ndarray  # (nodes, 2) including the equivalent loads of prescribed deformations
+    eigenstrain: np.ndarray  # (nodes, 2) eigenstrain offsets of dependent nodes
+    dependent_dof: np.ndarray  # (relations,)
+    master_dof: np.ndarray  # (relations,)
+    master_factor: np.ndarray  # (relations,)
+    master_eigenstrain: np.ndarray  # (relations,) bool
     constrained_dofs_count: int
     volume: float
+    # (dofs, 3) sparse map from macro strain coefficients (x, y, tan(angle)) to eigenstrain offsets,
+    # built from the relation arrays when not given
+    eigenstrain_operator: Optional[csr_matrix] = None
+
+    def __post_init__(self):
+        if self.eigenstrain_operator is None:
+            self.eigenstrain_operator = eigenstrain_operator(
+                self.coords, self.dependent_dof, self.master_dof, self.master_eigenstrain
+            )
+
+    def macro_eigenstrains(self, macro_strains: np.ndarray) -> np.ndarray:
+        """
+        Eigenstrain offsets of every macroscopic eigenstrain (x, y, angle) in the rows of macro_strains,
+        shape (cases, nodes, 2) as taken by the solvers' solve_eigenstrains, from one sparse product.
+        """
+        coefficients = macro_strain_coefficients(np.atleast_2d(macro_strains))
+        return (self.eigenstrain_operator @ coefficients.T).T.reshape(len(coefficients), -1, 2)
+
+    @property
+    def node_count(self) -> int:
+        return self.coords.shape[0]
+
+    @property
+    def element_count(self) -> int:
+        return self.connectivity.shape[0]
+
+    @property
+    def total_dof_count(self) -> int:
+        return self.coords.shape[0] * 2
+
+    @cached_property
+    def nodes(self) -> List[Node]:
+        nodes = [
+            Node(
+                index=i,
+                dx=dx,
+                dy=dy,
+                constrained_x=constrained_x,
+                constrained_y=constrained_y,
+                deformation_x=deformation_x,
+                deformation_y=deformation_y,
+                load_x=load_x,
+                load_y=load_y,
+                eigenstrain=self.eigenstrain[i].copy(),
+            )
+            for i, ((dx, dy), (constrained_x, constrained_y), (deformation_x, deformation_y), (load_x, load_y))
+            in enumerate(zip(
+                self.coords.tolist(), self.constrained.tolist(), self.deformations.tolist(), self.loads.tolist()
+            ))
+        ]
+
+        dependent_node_count = len(np.unique(self.dependent_dof // 2))
+        for dependent_dof, master_dof, factor, eigenstrain in zip(
+                self.dependent_dof.tolist(),
+                self.master_dof.tolist(),
+                self.master_factor.tolist(),
+                self.master_eigenstrain.tolist(),
+        ):
+            node = nodes[dependent_dof // 2]
+            direction = dependent_dof % 2
+
+            if node.dependency is None:
+                node.dependency = Dependency(
+                    masters=[],
+                    dependant_x=False,
+                    dependant_y=False,
+                    dependency_index=dependent_node_count,
+                )
+
+            if direction == 0:
+                node.dependency.dependant_x = True
+            else:
+                node.dependency.dependant_y = True
+
+            node.dependency.masters.append(MasterNode(
+                nodeIndex=master_dof // 2,
+                direction=direction,
+                factor=factor,
+                eigenstrain=eigenstrain,
+            ))
+
+        return nodes
+
+    @cached_property
+    def elements(self) -> List[Element]:
+        nodes = self.nodes
+        elements = [
+            Element(nodes=(nodes[start], nodes[end]), E=E, A=A)
+            for (start, end), E, A in zip(self.connectivity.tolist(), self.E.tolist(), self.A.tolist())
+        ]
+
+        # Element.__post_init__ adds the equivalent loads of prescribed deformations to its nodes
+        # once more, the stored loads already contain them
+        for node, (load_x, load_y) in zip(nodes, self.loads.tolist()):
+            node.load_x = load_x
+            node.load_y = load_y
+
+        return elements
+
+    @classmethod
+    def from_objects(
+            cls,
+            nodes: List[Node],
+            elements: List[Element],
+            constrained_dofs_count: int,
+            volume: float,
+    ) -> 'TrussData':
+        """Build the array representation from Node/Element objects, e.g. a hand-written truss."""
+        relations = [
+            (node.index * 2 + master.direction, master.nodeIndex * 2 + master.direction, master.factor, master.eigenstrain)
+            for node in nodes if node.dependency
+            for master in node.dependency.masters
+        ]
+
+        return cls(
+            coords=np.array([(node.dx, node.dy) for node in nodes], dtype=float).reshape(-1, 2),
+            connectivity=np.array(
+                [(element.nodes[0].index, element.nodes[1].index) for element in elements], dtype=np.int64
+            ).reshape(-1, 2),
+            E=np.array([element.E for element in elements], dtype=float),
+            A=np.array([element.A for element in elements], dtype=float),
+            constrained=np.array([(node.constrained_x, node.constrained_y) for node in nodes], dtype=bool).reshape(-1, 2),
+            deformations=np.array([(node.deformation_x, node.deformation_y) for node in nodes], dtype=float).reshape(-1, 2),
+            loads=np.array([(node.load_x, node.load_y) for node in nodes], dtype=float).reshape(-1, 2),
+            eigenstrain=np.array([node.eigenstrain for node in nodes], dtype=float).reshape(-1, 2),
+            dependent_dof=np.array([relation[0] for relation in relations], dtype=np.int64),
+            master_dof=np.array([relation[1] for relation in relations], dtype=np.int64),
+            master_factor=np.array([relation[2] for relation in relations], dtype=float),
+            master_eigenstrain=np.array([relation[3] for relation in relations], dtype=bool),
+            constrained_dofs_count=constrained_dofs_count,
+            volume=volume,
+        )
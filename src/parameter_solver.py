@@ -1,10 +1,15 @@
+from typing import Optional, Sequence
+
 import numpy as np
-from scipy.optimize import least_squares
 from termcolor import colored
 
+from batch_solver import BatchTrussSolver
+from cache import HomogenizationCache, structure_key
 from generator import create_cantilever_beam, create_tie_structure
+from material_fit import fit_iso, fit_orto, iso_D, orto_D
 from models import TrussData
 from plotter import export_vtk
+from sensitivity import StressSensitivities
 from solver import TrussSolver
 from structure_parser import StructureDefinition, parse_json_file, parse_structure_data
 
@@ -20,42 +25,101 @@ eigenstrainSets = [
 ]
 
 
-def solveParameters_iso(structure: StructureDefinition):
-    results = []
-    for eigenstrain in eigenstrainSets:
-        truss: TrussData = parse_structure_data(
-            structure, explicitEigenStrain=eigenstrain
-        )
-        solver = TrussSolver(truss)
-        res = solver.solve()
-        results.append(res)
-
-    Ds = np.array(results).T
-
-    def compute_D(params):
-        E, v = params
-        factor = E / (1 - v**2)
-        return factor * np.array([[1, v, 0], [v, 1, 0], [0, 0, (1 - v) / 2]])
-
-    def residuals(params):
-        D_pred = compute_D(params)
-        diff = (D_pred - Ds).flatten()
-        # we divide the difference by the norm of Ds to normalize the residuals for better numerical stability and cost scale
-        return diff / (
-            np.linalg.norm(Ds) + 1e-10
-        )  # add small value to avoid division by zero
-        # return diff # same results without cost normalization
-
-    # initial guesses and bounds
-    initial_guess = [210e6, 0.4]  # E in Pa, v dimensionless
-    bounds = ([1e2, 0], [1e12, 0.5])
-
-    result = least_squares(residuals, initial_guess, bounds=bounds)
-    fitted_E, fitted_v = result.x
+def homogenize(structure: StructureDefinition, cache: Optional[HomogenizationCache] = None) -> np.ndarray:
+    """
+    Compute the homogenized D matrix of a structure.
+
+    The structure is parsed and its reduced stiffness factorized once; the unit eigenstrains
+    from eigenstrainSets are mapped by the truss' eigenstrain operator and solved together as one multi-column right-hand side.
+    Column i of the result holds the stress response to eigenstrainSets[i].
+    With a cache a stored D of the same structure is returned without solving, new results
+    (and their displacement fields if the cache keeps them) are stored.
+    """
+    if cache is not None:
+        key = structure_key(structure, np.array(eigenstrainSets))
+        entry = cache.get(key)
+        if entry is not None:
+            return entry["D"]
+
+    truss: TrussData = parse_structure_data(structure)
+    solver = TrussSolver(truss)
+    D = solver.solve_macro_strains(np.array(eigenstrainSets))
+
+    if cache is not None:
+        cache.put(key, D, solver.displacements)
+    return D
+
+
+def homogenize_sensitivities(structure: StructureDefinition) -> tuple[np.ndarray, StressSensitivities]:
+    """
+    The homogenized D matrix of a structure and its derivatives.
+
+    Returns D and the sensitivities of every D entry with respect to the element areas, Young's
+    moduli and node coordinates (e.g. sensitivities.A[i, j, e] = dD[i, j] / dA[e]), computed with
+    the adjoint method in the same factorization as D. The volume of the structure is held fixed.
+    """
+    truss: TrussData = parse_structure_data(structure)
+    solver = TrussSolver(truss)
+    D = solver.solve_macro_strains(np.array(eigenstrainSets), compute_sensitivities=True)
+    return D, solver.sensitivities
+
+
+def homogenize_batch(
+        structures: Sequence[StructureDefinition],
+        cache: Optional[HomogenizationCache] = None,
+) -> np.ndarray:
+    """
+    Compute the D matrices of many structures sharing one topology, shape (structures, 3, 3).
+
+    Meant for sweeps over small unit cells where only the geometry changes; all reduced systems
+    are solved together with one batched dense solve, see BatchTrussSolver.
+    With a cache only the structures without a stored D are solved.
+    """
+    Ds = np.empty((len(structures), 3, 3))
+    missing = list(range(len(structures)))
+
+    if cache is not None:
+        keys = [structure_key(structure, np.array(eigenstrainSets)) for structure in structures]
+        missing = []
+        for index, key in enumerate(keys):
+            entry = cache.get(key)
+            if entry is None:
+                missing.append(index)
+            else:
+                Ds[index] = entry["D"]
+        if not missing:
+            return Ds
+
+    trusses = [parse_structure_data(structures[index]) for index in missing]
+    solver = BatchTrussSolver(trusses)
+    Ds[missing] = solver.solve_macro_strains(np.array(eigenstrainSets))
+
+    if cache is not None:
+        for batch_index, index in enumerate(missing):
+            cache.put(keys[index], Ds[index], solver.displacements[batch_index])
+    return Ds
+
+
+def solveParameters_iso(
+        structure: StructureDefinition,
+        method: str = "least_squares",
+        cache: Optional[HomogenizationCache] = None,
+):
+    return fitParameters_iso(homogenize(structure, cache), method)
+
+
+def fit_cost(D_fitted: np.ndarray, Ds: np.ndarray) -> float:
+    # the difference is divided by the norm of Ds to normalize the residuals for better numerical stability and cost scale
+    return 0.5 * float(np.sum(((D_fitted - Ds) / (np.linalg.norm(Ds) + 1e-10)) ** 2))
+
+
+def fitParameters_iso(Ds: np.ndarray, method: str = "least_squares"):
+    """Fit and report isotropic E, v of one D matrix, see material_fit.fit_iso for the methods."""
+    fitted_E, fitted_v = fit_iso(Ds, method)
 
     print(colored(f"D matrix from DOF elimination solver:\n{Ds}\n", "cyan"))
 
-    D_fitted = compute_D([fitted_E, fitted_v])
+    D_fitted = iso_D([fitted_E, fitted_v])
     print(colored(f"Fitted D matrix:\n{D_fitted}\n", "light_green"))
 
     print(
@@ -64,54 +128,27 @@ def solveParameters_iso(structure: StructureDefinition):
         )
     )
     print("")
-    # print("Optimization success:", result.success)
-    print(colored(f"Final cost: {result.cost}", "light_red"))
+    print(colored(f"Final cost: {fit_cost(D_fitted, Ds)}", "light_red"))
 
     return fitted_E, fitted_v
 
 
-def solveParameters_orto(structure: StructureDefinition):
-    results = []
-    for eigenstrain in eigenstrainSets:
-        truss: TrussData = parse_structure_data(
-            structure, explicitEigenStrain=eigenstrain
-        )
-        solver = TrussSolver(truss)
-        res = solver.solve()
-        results.append(res)
-
-    Ds = np.array(results).T
-
-    print(colored(f"D matrix from DOF elimination solver:\n{Ds}\n", "cyan"))
+def solveParameters_orto(
+        structure: StructureDefinition,
+        method: str = "least_squares",
+        cache: Optional[HomogenizationCache] = None,
+):
+    return fitParameters_orto(homogenize(structure, cache), method)
 
-    def compute_D(params):
-        Ex, Ey, vxy, vyx, Gxy = params
-        factor = 1 / (1 - vxy * vyx)
-        return factor * np.array(
-            [
-                [Ex, vyx * Ex, 0],
-                [vxy * Ey, Ey, 0],
-                [0, 0, Gxy * (1 - vxy * vyx)],
-            ]  # division may be off
-        )
 
-    def residuals(params):
-        D_pred = compute_D(params)
-        diff = (D_pred - Ds).flatten()
-        # we divide the difference by the norm of Ds to normalize the residuals for better numerical stability and cost scale
-        return diff / (
-            np.linalg.norm(Ds) + 1e-10
-        )  # add small value to avoid division by zero
-        # return diff # same results without cost normalization
+def fitParameters_orto(Ds: np.ndarray, method: str = "least_squares"):
+    """Fit and report orthotropic Ex, Ey, vxy, vyx, Gxy of one D matrix, see material_fit.fit_orto."""
 
-    # initial guesses and bounds
-    initial_guess = [210e6, 210e6, 0.4, 0.4, 21e6]  # E in Pa, v dimensionless
-    bounds = ([1e2, 1e2, -1, -1, 0], [1e12, 1e12, 0.5, 0.5, 1e12])
+    print(colored(f"D matrix from DOF elimination solver:\n{Ds}\n", "cyan"))
 
-    result = least_squares(residuals, initial_guess, bounds=bounds)
-    f_Ex, f_Ey, f_vxy, f_vyx, f_Gxy = result.x
+    f_Ex, f_Ey, f_vxy, f_vyx, f_Gxy = fit_orto(Ds, method)
 
-    D_fitted = compute_D([f_Ex, f_Ey, f_vxy, f_vyx, f_Gxy])
+    D_fitted = orto_D([f_Ex, f_Ey, f_vxy, f_vyx, f_Gxy])
 
     print(colored(f"Fitted D matrix:\n{D_fitted}\n", "light_green"))
 
@@ -1,39 +1,265 @@
+import base64
+from typing import List, Optional, Tuple
+
 import numpy as np
 
+from assembly import axial_forces, element_arrays
 from models import TrussData
 from termcolor import colored
 
-def export_vtk(truss: TrussData):
-    # convert nodes and deformations to Vec3
-    points = np.array([[node.dx, node.dy, 0.0] for node in truss.nodes])
-    displacements = np.array([
-        [node.local_deformations[0] if node.local_deformations is not None else 0.0,
-        node.local_deformations[1] if node.local_deformations is not None else 0.0,
-        0.0] for node in truss.nodes
-    ])
+VTK_LINE = 3
+VTU_ENCODINGS = ("raw", "base64")
+
+# VTK type names of the numpy dtypes written to a VTU file
+_VTK_TYPES = {
+    np.dtype("<f8"): "Float64",
+    np.dtype("<i8"): "Int64",
+    np.dtype("u1"): "UInt8",
+}
+
+
+def _little_endian(values: np.ndarray, dtype: str) -> np.ndarray:
+    return np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+
+
+def _case_columns(values: np.ndarray, name: str) -> List[Tuple[str, np.ndarray]]:
+    # one array per load case when a solver solved several (last axis), suffixed with the case index
+    if values.ndim == 1:
+        return [(name, values)]
+    return [(f"{name}_{case}", values[:, case]) for case in range(values.shape[1])]
+
+
+def write_vtu(
+        path: str,
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        point_data: Optional[List[Tuple[str, np.ndarray]]] = None,
+        cell_data: Optional[List[Tuple[str, np.ndarray]]] = None,
+        encoding: str = "raw",
+):
+    """
+    Write a truss as a VTK XML unstructured grid (.vtu) of line cells, readable by ParaView.
+
+    point_data / cell_data are (name, array) pairs with one row per node / element, 2D arrays are written
+    as vectors (2 component vectors are padded to 3 so ParaView can warp by them). All arrays go to one
+    appended data block, either as raw bytes or base64; the file is written in a few bulk writes.
+    """
+    if encoding not in VTU_ENCODINGS:
+        raise ValueError(f"Unknown VTU encoding '{encoding}', expected one of {VTU_ENCODINGS}")
+
+    element_count = len(connectivity)
+    points = np.column_stack([coords, np.zeros(len(coords))])
+
+    def vectors(values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 2 and values.shape[1] == 2:
+            values = np.column_stack([values, np.zeros(len(values))])
+        return values
+
+    sections = {
+        "Points": [("Points", _little_endian(points, "f8"))],
+        "Cells": [
+            ("connectivity", _little_endian(np.ravel(connectivity), "i8")),
+            ("offsets", _little_endian(np.arange(2, 2 * element_count + 1, 2), "i8")),
+            ("types", np.full(element_count, VTK_LINE, dtype=np.uint8)),
+        ],
+        "PointData": [(name, _little_endian(vectors(values), "f8")) for name, values in point_data or []],
+        "CellData": [(name, _little_endian(vectors(values), "f8")) for name, values in cell_data or []],
+    }
+
+    blocks = []
+    offset = 0
+    xml = {}
+    for section, arrays in sections.items():
+        tags = []
+        for name, values in arrays:
+            components = values.shape[1] if values.ndim == 2 else 1
+            tags.append(
+                f'        <DataArray type="{_VTK_TYPES[values.dtype]}" Name="{name}" '
+                f'NumberOfComponents="{components}" format="appended" offset="{offset}"/>'
+            )
+            data = values.tobytes()
+            header = np.uint64(len(data)).tobytes()
+            if encoding == "base64":
+                # header and data are encoded separately, as VTK itself does for uncompressed data
+                block = base64.b64encode(header) + base64.b64encode(data)
+            else:
+                block = header + data
+            blocks.append(block)
+            offset += len(block)
+        xml[section] = "\n".join(tags)
+
+    head = (
+        '<?xml version="1.0"?>\n'
+        '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64">\n'
+        '  <UnstructuredGrid>\n'
+        f'    <Piece NumberOfPoints="{len(points)}" NumberOfCells="{element_count}">\n'
+        f'      <PointData>\n{xml["PointData"]}\n      </PointData>\n'
+        f'      <CellData>\n{xml["CellData"]}\n      </CellData>\n'
+        f'      <Points>\n{xml["Points"]}\n      </Points>\n'
+        f'      <Cells>\n{xml["Cells"]}\n      </Cells>\n'
+        '    </Piece>\n'
+        '  </UnstructuredGrid>\n'
+        f'  <AppendedData encoding="{encoding}">\n'
+        '    _'
+    )
+    tail = '\n  </AppendedData>\n</VTKFile>\n'
+
+    with open(path, "wb") as f:
+        f.write(head.encode())
+        for block in blocks:
+            f.write(block)
+        f.write(tail.encode())
+
 
+def export_vtk(
+        truss: TrussData,
+        displacements: Optional[np.ndarray] = None,
+        forces: Optional[np.ndarray] = None,
+        path: str = "truss.vtu",
+        encoding: str = "raw",
+):
+    """
+    Write a truss and its solution to a VTU file, see write_vtu.
+
+    displacements is the global displacement vector of a solver (solver.displacements), forces the
+    matching element axial forces (solver.axial_forces); both may hold several load cases as columns.
+    Missing forces are computed from the displacements in one vectorized pass.
+    """
+    coords, connectivity, E, A = element_arrays(truss)
+    if displacements is None:
+        displacements = np.zeros(coords.size)
+    if forces is None:
+        forces = axial_forces(coords, connectivity, E, A, displacements)
+
+    # (dofs, cases) -> (nodes, 2, cases), each case becomes a vector field
+    node_displacements = displacements.reshape(len(coords), 2, -1)
+    if displacements.ndim == 1:
+        point_data = [("displacement", node_displacements[:, :, 0])]
+    else:
+        point_data = [
+            (f"displacement_{case}", node_displacements[:, :, case]) for case in range(node_displacements.shape[2])
+        ]
+
+    cell_data = _case_columns(np.asarray(forces), "axial_force") + [("E", E), ("A", A)]
+    write_vtu(path, coords, connectivity, point_data, cell_data, encoding)
+
+
+def _select_case(values: np.ndarray, case: Optional[int], name: str) -> np.ndarray:
+    # one load case (column) of a multi-case solver result, Typst blocks hold a single case
+    values = np.asarray(values)
+    if values.ndim == 1:
+        if case not in (None, 0):
+            raise ValueError(f"{name} holds a single load case, case {case} does not exist")
+        return values
+    if case is None:
+        raise ValueError(f"{name} holds {values.shape[1]} load cases, pick one with case")
+    if not -values.shape[1] <= case < values.shape[1]:
+        raise ValueError(f"{name} holds {values.shape[1]} load cases, case {case} does not exist")
+    return values[:, case]
+
+
+def print_typst(truss: TrussData, displacements: Optional[np.ndarray] = None, case: Optional[int] = None):
+    """
+    Print the points, connections and displacements of a truss as Typst literals.
+
+    displacements of several load cases (dofs, cases) need the case to print.
+    """
+    coords, connectivity, _, _ = element_arrays(truss)
+    if displacements is None:
+        displacements = np.zeros(coords.size)
+    else:
+        displacements = _select_case(displacements, case, "displacements")
 
     print(colored("#let points = (","black", "on_light_blue"))
-    for node in truss.nodes:
-        print(colored(f"    ({node.dx}, {node.dy}),", "light_blue"))
+    for dx, dy in coords.tolist():
+        print(colored(f"    ({dx}, {dy}),", "light_blue"))
     print(colored(")", "light_blue"))
 
     print(colored("#let connections = (","black", "on_light_yellow"))
-    for element in truss.elements:
-        n1 = element.nodes[0].index
-        n2 = element.nodes[1].index
+    for n1, n2 in connectivity.tolist():
         print(colored(f"    (\"{n1}\", \"{n2}\"),", "light_yellow"))
     print(colored(")", "light_yellow"))
 
     print(colored('#let displacements = (', 'black', 'on_light_green'))
-    for dx, dy, _ in displacements:
+    for dx, dy in displacements.reshape(-1, 2).tolist():
         print(colored(f"    ({dx}, {dy}),", "light_green"))
     print(colored(")", "light_green"))
 
 
-    forces = np.array([element.axial_force() for element in truss.elements])
+def decimate_members(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        forces: np.ndarray,
+        max_members: Optional[int] = None,
+        viewport: Optional[Tuple[float, float, float, float]] = None,
+) -> np.ndarray:
+    """
+    Indices of the members to draw, ascending: the members with an end inside viewport
+    (x_min, y_min, x_max, y_max), then at most max_members of them with the largest |force|.
+    forces holds one value per member, a single load case.
+    """
+    forces = np.asarray(forces)
+    if forces.ndim != 1:
+        raise ValueError(f"decimate_members needs the forces of one load case (m,), got shape {forces.shape}")
 
-    # create lines from elements, 2 specifies number of points per line
-    lines = np.array([[2, element.nodes[0].index, element.nodes[1].index] for element in truss.elements]).flatten()
+    keep = np.arange(len(connectivity))
+    if viewport is not None:
+        x_min, y_min, x_max, y_max = viewport
+        ends = coords[connectivity]
+        inside = (ends[..., 0] >= x_min) & (ends[..., 0] <= x_max) & (ends[..., 1] >= y_min) & (ends[..., 1] <= y_max)
+        keep = keep[inside.any(axis=1)]
+    if max_members is not None and len(keep) > max_members:
+        magnitude = np.abs(forces[keep])
+        keep = np.sort(keep[np.argpartition(-magnitude, max_members - 1)[:max_members]]) if max_members > 0 else keep[:0]
+    return keep
+
+
+def _typst_tuple(name: str, rows: List[str]) -> str:
+    return f"#let {name} = (\n" + "".join(f"    {row},\n" for row in rows) + ")\n"
+
+
+def write_typst(
+        path: str,
+        truss: TrussData,
+        displacements: Optional[np.ndarray] = None,
+        forces: Optional[np.ndarray] = None,
+        max_members: Optional[int] = None,
+        viewport: Optional[Tuple[float, float, float, float]] = None,
+        case: Optional[int] = None,
+):
+    """
+    Write the points, connections, displacements and member forces of a truss as a Typst data file,
+    to be imported by a document (#import "truss.typ": points, connections, displacements, forces).
+
+    The blocks have the layout print_typst prints. For large lattices the members can be decimated
+    (see decimate_members); only the nodes of the kept members are written, renumbered in order.
+    Results of several load cases (displacements (dofs, cases), forces (m, cases), as returned by
+    solve_macro_strains) are written for the one load case picked by case.
+    The whole file is formatted in memory and written at once.
+    """
+    coords, connectivity, E, A = element_arrays(truss)
+    if displacements is None:
+        displacements = np.zeros(coords.size)
+    else:
+        displacements = _select_case(displacements, case, "displacements")
+    if forces is None:
+        forces = axial_forces(coords, connectivity, E, A, displacements)
+    else:
+        forces = _select_case(forces, case, "forces")
+
+    members = decimate_members(coords, connectivity, forces, max_members, viewport)
+    nodes, kept_connectivity = np.unique(connectivity[members], return_inverse=True)
+    kept_connectivity = kept_connectivity.reshape(-1, 2)
+
+    content = "".join([
+        _typst_tuple("points", [f"({dx}, {dy})" for dx, dy in coords[nodes].tolist()]),
+        _typst_tuple("connections", [f'("{n1}", "{n2}")' for n1, n2 in kept_connectivity.tolist()]),
+        _typst_tuple(
+            "displacements", [f"({dx}, {dy})" for dx, dy in displacements.reshape(-1, 2)[nodes].tolist()]
+        ),
+        _typst_tuple("forces", [f"{force}" for force in forces[members].tolist()]),
+    ])
 
-    # construct PolyData with points and lines to avoid assignment-type mismatch
\ No newline at end of file
+    with open(path, "w") as f:
+        f.write(content)
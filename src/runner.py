@@ -1,41 +1,77 @@
-import matplotlib
-import numpy as np
+import argparse
 import math
+import os
 import time
+from typing import Optional, Sequence
+
+import matplotlib
+import numpy as np
 
 from generator import create_tie_structure, create_tie_structure_angle
-from parameter_solver import solveParameters_iso, solveParameters_orto
+from sweep import iterate_sweep, run_sweep
 
 #matplotlib.use("QtAgg")
 import matplotlib.pyplot as plt
 
-height = 0.1
-width = height * 1
-max_angle = math.degrees(math.atan(height / width))
 
-x = np.linspace(0.001, max_angle, 50, endpoint=False)
+def sweep_angles(
+        height: float,
+        width: float,
+        angles: Sequence[float],
+        workers: int = 1,
+        chunksize: Optional[int] = None,
+        verbose: bool = True,
+) -> np.ndarray:
+    """
+    Fitted (Ex, Ey, vxy, vyx, Gxy) of the tie cell for every angle, rows in the order of angles.
+
+    In memory counterpart of run_sweep for short sweeps, see sweep.iterate_sweep for the pool.
+    """
+    chunks = iterate_sweep(
+        create_tie_structure_angle,
+        {"angle": angles},
+        fixed={"height": height, "width": width},
+        workers=workers,
+        chunksize=chunksize,
+        verbose=verbose,
+    )
+    return np.concatenate([results for _, results in chunks]).reshape(-1, 5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Angle sweep of the tie cell")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes, 1 runs serially")
+    parser.add_argument("--chunksize", type=int, default=None, help="angles per pool task")
+    parser.add_argument("--count", type=int, default=50, help="number of angles")
+    parser.add_argument("--output", default="output.csv", help="streamed result rows")
+    parser.add_argument("--restart", action="store_true", help="start over instead of resuming from the checkpoint")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args()
 
-results = []
-total = len(x)
-start_time = time.perf_counter()
+    height = 0.1
+    width = height * 1
+    max_angle = math.degrees(math.atan(height / width))
 
-for idx, angle in enumerate(x, start=1):
-    elapsed = time.perf_counter() - start_time
-    progress_message = f"Solving {idx}/{total} | elapsed: {elapsed:.2f}s"
-    print(f"\r{progress_message:<80}", end="", flush=True)
-    results.append(solveParameters_orto(create_tie_structure_angle(height, width, angle)))
+    x = np.linspace(0.001, max_angle, args.count, endpoint=False)
 
-total_elapsed = time.perf_counter() - start_time
-final_message = f"Solved {total}/{total} | total: {total_elapsed:.2f}s"
-print(f"\r{final_message:<80}")
-Ex, Ey, vxy, vyx, Gxy = zip(*results)
+    start_time = time.perf_counter()
+    solved = run_sweep(
+        create_tie_structure_angle,
+        {"angle": x},
+        args.output,
+        fixed={"height": height, "width": width},
+        workers=args.workers,
+        chunksize=args.chunksize,
+        resume=not args.restart,
+        verbose=not args.quiet,
+    )
+    total_elapsed = time.perf_counter() - start_time
+    print(f"Fitted {solved}/{len(x)} | total: {total_elapsed:.2f}s | {solved / total_elapsed:.0f} cells/s")
 
-np.savetxt(
-    "output.csv", np.column_stack((x, Ex, Ey, vxy, vyx, Gxy)), delimiter=",", comments=""
-)
+    angle, Ex, Ey, vxy, vyx, Gxy = np.loadtxt(args.output, delimiter=",", skiprows=1, ndmin=2).T
 
-plt.plot(x, vxy, label="vxy")
-plt.plot(x, vyx, label="vyx")
-plt.xlabel("Angle")
-plt.legend()
-plt.show()
+    plt.plot(angle, vxy, label="vxy")
+    plt.plot(angle, vyx, label="vyx")
+    plt.xlabel("Angle")
+    plt.legend()
+    plt.show()
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from assembly import element_dofs, element_geometry
+
+
+@dataclass
+class StressSensitivities:
+    """
+    Derivatives of the homogenized stresses (xx, yy, xy) of every load case.
+
+    Component k and case c of TrussSolver.solve_eigenstrains differentiated with respect to
+    the per-element areas and Young's moduli and the node coordinates. For the unit
+    eigenstrains of parameter_solver.homogenize, A[:, c] is the derivative of column c of D.
+    """
+    A: np.ndarray  # (3, cases, elements)
+    E: np.ndarray  # (3, cases, elements)
+    coords: np.ndarray  # (3, cases, nodes, 2)
+
+    def squeeze_case(self) -> 'StressSensitivities':
+        """Drop the case axis of a single load case solve."""
+        return StressSensitivities(A=self.A[:, 0], E=self.E[:, 0], coords=self.coords[:, 0])
+
+
+def stress_projections(cos_sin: np.ndarray) -> np.ndarray:
+    """(cos^2, sin^2, 2 cos sin) of every element, shape (m, 3), the weights of homogenized_stress."""
+    cos = cos_sin[:, 0]
+    sin = cos_sin[:, 1]
+    return np.stack([cos * cos, sin * sin, 2 * cos * sin], axis=-1)
+
+
+def stress_displacement_gradient(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        E: np.ndarray,
+        A: np.ndarray,
+        volume: float,
+) -> np.ndarray:
+    """
+    Gradient g of the homogenized stresses with respect to the global displacements, shape (dofs, 3).
+
+    The stress is linear in the displacements, homogenized_stress of axial_forces(u) equals g.T @ u;
+    g is the load vector of the adjoint problems.
+    """
+    _, cos_sin = element_geometry(coords, connectivity)
+    weights = (1 / volume) * (E * A)[:, np.newaxis] * stress_projections(cos_sin)
+
+    # L * N = E * A * n . (u_end - u_start)
+    element_gradient = np.concatenate([-cos_sin, cos_sin], axis=1)[:, :, np.newaxis] * weights[:, np.newaxis, :]
+
+    gradient = np.zeros((coords.shape[0] * 2, 3))
+    np.add.at(gradient, element_dofs(connectivity).ravel(), element_gradient.reshape(-1, 3))
+    return gradient
+
+
+def element_sensitivities(
+        coords: np.ndarray,
+        connectivity: np.ndarray,
+        E: np.ndarray,
+        A: np.ndarray,
+        volume: float,
+        displacements: np.ndarray,
+        adjoints: np.ndarray,
+        residuals: np.ndarray,
+) -> StressSensitivities:
+    """
+    Explicit and adjoint element contributions to the stress sensitivities.
+
+    displacements (dofs, cases) is the solution, adjoints (dofs, 3) the adjoint fields mapped
+    to all DOFs and residuals (dofs, cases) the field the stiffness acts on in the reduced
+    right-hand side, so that dK changes it by -adjoint^T dK residual. The volume is held fixed.
+    """
+    node_count = coords.shape[0]
+    cases = displacements.shape[1]
+
+    lengths, cos_sin = element_geometry(coords, connectivity)
+    projections = stress_projections(cos_sin)
+    stiffness = E * A
+
+    def element_delta(values: np.ndarray) -> np.ndarray:
+        node_values = values.reshape(node_count, 2, -1)
+        return node_values[connectivity[:, 1]] - node_values[connectivity[:, 0]]
+
+    def project(delta: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # axial part n . delta and the transverse remainder (I - n n^T) delta
+        axial = np.einsum("ed,edc->ec", cos_sin, delta)
+        return axial, delta - cos_sin[:, :, np.newaxis] * axial[:, np.newaxis, :]
+
+    u_axial, u_transverse = project(element_delta(displacements))  # (m, cases), (m, 2, cases)
+    adjoint_axial, adjoint_transverse = project(element_delta(adjoints))  # (m, 3), (m, 2, 3)
+    residual_axial, residual_transverse = project(element_delta(residuals))  # (m, cases), (m, 2, cases)
+
+    # explicit term (E A / V) p_k (n . du), adjoint term -(E A / L) (n . d_adjoint) (n . d_residual)
+    explicit = (1 / volume) * np.einsum("ek,ec->kce", projections, u_axial)
+    adjoint = np.einsum("ek,ec->kce", adjoint_axial, residual_axial) / lengths
+    dA = E * (explicit - adjoint)
+    dE = A * (explicit - adjoint)
+
+    # derivative of p with respect to n, projected on the element normal
+    cos = cos_sin[:, 0]
+    sin = cos_sin[:, 1]
+    zero = np.zeros_like(cos)
+    projection_gradient = np.stack([
+        np.stack([2 * cos, zero], axis=-1),
+        np.stack([zero, 2 * sin], axis=-1),
+        np.stack([2 * sin, 2 * cos], axis=-1),
+    ], axis=1)  # (m, 3, 2)
+    projection_gradient -= np.einsum("ekd,ed->ek", projection_gradient, cos_sin)[:, :, np.newaxis] * cos_sin[:, np.newaxis, :]
+
+    # d/d(x_end - x_start) of the explicit and the adjoint term
+    explicit_delta = (stiffness / (volume * lengths))[:, np.newaxis, np.newaxis, np.newaxis] * (
+        np.einsum("ekd,ec->ekcd", projection_gradient, u_axial)
+        + np.einsum("ek,edc->ekcd", projections, u_transverse)
+    )
+    adjoint_delta = (stiffness / lengths**2)[:, np.newaxis, np.newaxis, np.newaxis] * (
+        np.einsum("ek,ec,ed->ekcd", -adjoint_axial, residual_axial, cos_sin)
+        + np.einsum("edk,ec->ekcd", adjoint_transverse, residual_axial)
+        + np.einsum("ek,edc->ekcd", adjoint_axial, residual_transverse)
+    )
+    delta_sensitivity = explicit_delta - adjoint_delta  # (m, 3, cases, 2)
+
+    d_coords = np.zeros((node_count, 3, cases, 2))
+    np.add.at(d_coords, connectivity[:, 1], delta_sensitivity)
+    np.add.at(d_coords, connectivity[:, 0], -delta_sensitivity)
+
+    return StressSensitivities(A=dA, E=dE, coords=d_coords.transpose(1, 2, 0, 3))
+
+
+def eigenstrain_offset_sensitivities(
+        node_count: int,
+        dependent_dof: np.ndarray,
+        master_dof: np.ndarray,
+        master_eigenstrain: np.ndarray,
+        macro_strains: np.ndarray,
+        offset_weights: np.ndarray,
+) -> np.ndarray:
+    """
+    Coordinate sensitivities coming from the eigenstrain offsets, shape (3, cases, nodes, 2).
+
+    The offsets are the ones of eigenstrain.eigenstrain_operator (TrussData.macro_eigenstrains) for the
+    macro strains (cases, 3) as (x, y, angle); they depend linearly on the dependent and master positions.
+    offset_weights (dofs, 3) is the derivative of each stress component with respect to the
+    offset of every DOF.
+    """
+    carries = master_eigenstrain.astype(bool)
+    dependent = dependent_dof[carries]
+    master = master_dof[carries]
+    direction = dependent % 2
+    other = 1 - direction
+
+    # offset[dependent] -= (x_master - x_dependent)[direction] * strain[direction]
+    #                      + shear * (x_master - x_dependent)[other]
+    strains = macro_strains[:, direction]  # (cases, relations)
+    shear = np.tan(macro_strains[:, 2])[:, np.newaxis] / 2  # (cases, 1)
+    weights = offset_weights[dependent].T[:, np.newaxis, :]  # (3, 1, relations)
+
+    along = weights * strains
+    across = weights * shear
+
+    sensitivities = np.zeros((3, len(macro_strains), node_count * 2))
+    np.add.at(sensitivities, (slice(None), slice(None), master), -along)
+    np.add.at(sensitivities, (slice(None), slice(None), dependent), along)
+    np.add.at(sensitivities, (slice(None), slice(None), master - direction + other), -across)
+    np.add.at(sensitivities, (slice(None), slice(None), dependent - direction + other), across)
+    return sensitivities.reshape(3, len(macro_strains), node_count, 2)
@@ -1,153 +1,276 @@
+from typing import Callable, Optional
+
 import numpy as np
+from assembly import (
+    assemble_truss_stiffness,
+    axial_forces,
+    element_arrays,
+    element_dofs,
+    element_stiffness_blocks,
+    homogenized_stress,
+    stiffness_product,
+)
+from constraints import CompiledConstraints, compile_constraints
+from instrumentation import PhaseRecorder, PhaseStats, SolveStats
+from iterative import ElementOperator, IterativeSolveInfo, solve_cg
+from linear_solver import BACKENDS, BackendInfo, resolve_backend, solve_direct
 from models import TrussData
-from scipy.sparse import lil_matrix, identity, bmat
-from scipy.sparse.linalg import spsolve
+from sensitivity import (
+    StressSensitivities,
+    eigenstrain_offset_sensitivities,
+    element_sensitivities,
+    stress_displacement_gradient,
+)
 
 
 class TrussSolver:
 
-    def __init__(self, truss: TrussData):
-        self.truss = truss
-
-    def solve(self) -> np.ndarray:
-
-        total_dof_count = len(self.truss.nodes) * 2
-
-        # arrays to hold indices of free, dependent, and fixed dofs
-        free_dof_indices = []
-        dependent_dof_indices = []
-        fixed_dof_indices = []
-
-        # iterate over nodes and classify their DOFs
+    iterative_info: Optional[IterativeSolveInfo] = None
+    backend_info: Optional[BackendInfo] = None
+    sensitivities: Optional[StressSensitivities] = None
+    stats: Optional[SolveStats] = None
+    displacements: np.ndarray
+    axial_forces: np.ndarray
+
+    def __init__(
+            self,
+            truss: TrussData,
+            constraints: Optional[CompiledConstraints] = None,
+            backend: str = "auto",
+            preconditioner: str = "jacobi",
+            tolerance: float = 1e-10,
+            max_iterations: Optional[int] = None,
+            dense_threshold: Optional[int] = None,
+            iterative_threshold: Optional[int] = None,
+            instrument: bool = False,
+            trace_memory: bool = False,
+            on_phase: Optional[Callable[[PhaseStats], None]] = None,
+    ):
         """
-        Classification example with 3 nodes (6 DOFs):
-          Free DOFs:      [0, 3]         (Node 0-x, Node 1-y)
-          Dependent DOFs: [1, 4]         (Node 0-y, Node 2-x)
-          Fixed DOFs:     [2, 5]         (Node 1-x, Node 2-y)
-        
-          Global DOF indices: [0, 1, 2, 3, 4, 5]
-          Reordered DOFIDs:   [0, 3, 1, 4, 2, 5]
-                               ^  ^  ^  ^  ^  ^
-                               Free  Dependent  Fixed
+        backend "dense" (LAPACK Cholesky) and "sparse" (SuperLU) factorize the assembled reduced
+        stiffness, "cg" never assembles K and solves with preconditioned conjugate gradients
+        ("jacobi", "ilu" or "none" preconditioner) to the given relative tolerance.
+        "auto" picks one by the number of free DOFs, see linear_solver.select_backend; the
+        thresholds default to linear_solver.DENSE_THRESHOLD and ITERATIVE_THRESHOLD.
+        The chosen backend and its timing are stored in backend_info, the CG convergence
+        report in iterative_info.
+        With instrument every solve stores the wall time, sizes and nnz of its phases (constraints,
+        load_cases, assembly, reduction, solve, postprocess, sensitivities) in stats, trace_memory adds their
+        tracemalloc peaks; see instrumentation.PhaseRecorder. The constraint compilation of the
+        constructor is reported with the first solve.
         """
-        for node in self.truss.nodes:
-
-            # X direction DOF
-            x_dof = node.index * 2
-            if node.dependency and node.dependency.dependant_x:
-                dependent_dof_indices.append(x_dof)
-            elif node.constrained_x:
-                fixed_dof_indices.append(x_dof)
-            else:
-                free_dof_indices.append(x_dof)
-
-            # Y direction DOF
-            y_dof = x_dof + 1
-            if node.dependency and node.dependency.dependant_y:
-                dependent_dof_indices.append(y_dof)
-            elif node.constrained_y:
-                fixed_dof_indices.append(y_dof)
-            else:
-                free_dof_indices.append(y_dof)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
 
+        self.truss = truss
+        self._recorder = PhaseRecorder(instrument, trace_memory, on_phase)
+
+        self._recorder.start()
+        with self._recorder.phase("constraints") as phase:
+            # constraints only depend on the topology, so callers may pass a compiled set around
+            self.constraints = constraints if constraints is not None else compile_constraints(truss)
+            phase.count("free", len(self.constraints.free_dofs))
+            phase.count("dependent", len(self.constraints.dependent_dofs))
+            phase.count("fixed", len(self.constraints.fixed_dofs))
+            phase.matrix("X", self.constraints.X)
+        self._setup_phases = self._recorder.stop().phases
+        self.backend = backend
+        self.preconditioner = preconditioner
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.dense_threshold = dense_threshold
+        self.iterative_threshold = iterative_threshold
+
+    def solve(self, compute_sensitivities: bool = False, macro_strain: Optional[np.ndarray] = None) -> np.ndarray:
+        result = self.solve_eigenstrains(
+            self.truss.eigenstrain[np.newaxis],
+            compute_sensitivities,
+            None if macro_strain is None else np.reshape(macro_strain, (1, 3)),
+        )[:, 0]
+        self.displacements = self.displacements[:, 0]
+        self.axial_forces = self.axial_forces[:, 0]
+        if compute_sensitivities:
+            self.sensitivities = self.sensitivities.squeeze_case()
+        return result
+
+    def solve_macro_strains(self, macro_strains: np.ndarray, compute_sensitivities: bool = False) -> np.ndarray:
         """
-        X matrix structure:
-          +-------+-------+
-          │  X11  │  None │ <- Free DOFs
-          +-------+-------+
-          │  XD1  │  XD2  │ <- Dependent DOFs
-          +-------+-------+
-          │  None │  X22  │ <- Fixed DOFs
-          +-------+-------+
-             Free   Fixed
-        """
+        solve_eigenstrains for macroscopic eigenstrains (cases, 3) as (x, y, angle), e.g. eigenstrainSets.
 
-        free_and_fixed_indices = free_dof_indices + fixed_dof_indices
-
-        # create the xd1+xd2 matrix
-        XD = lil_matrix((len(dependent_dof_indices), len(free_and_fixed_indices)))
-        # create index map beforehand, so we don't have to index array every time
-        reduced_index_map = {dof: idx for idx, dof in enumerate(free_and_fixed_indices)}
-
-        for local_i, global_i in enumerate(dependent_dof_indices):
-            # we get the node ID and direction from the global index by undoing the mapping
-            node_id = global_i // 2
-            direction = global_i % 2
-
-            node = self.truss.nodes[node_id]
-
-            filtered_masters = [  # filter only the direction we are currently processing
-                master for master in node.dependency.masters
-                if master.direction == direction
-            ]
-
-            for master in filtered_masters:
-                master_global_dof = master.nodeIndex * 2 + master.direction  # convert to global index
-                if master_global_dof in reduced_index_map:
-                    master_local_index = reduced_index_map[master_global_dof]
-                    # fox y coordinates we can increment loop index since we already have ordered the DOFs
-                    # for x coordinates we use the master_local_index (note that this is the local index in the reduced matrix)
-                    XD[local_i, master_local_index] = master.factor
-
-        XD = XD.tocsr()
-        # now we can split the XD matrix into XD1 (free DOFs) and XD2 (fixed DOFs)
-        XD1 = XD[:, :len(free_dof_indices)]
-        XD2 = XD[:, len(free_dof_indices):]
-        
-        X11 = identity(len(free_dof_indices))
-        X22 = identity(len(fixed_dof_indices))
-
-        # and assemble the full X matrix
-        x_mat = bmat([
-            [X11, None],
-            [XD1, XD2],
-            [None, X22]
-        ])
-        x_mat = x_mat.tocsr()
-        
-        # initialize reduced displacement and force vectors with known lengths
-        u_reduced = np.zeros(len(free_and_fixed_indices))
-        f_vec = np.zeros(len(free_dof_indices) + len(dependent_dof_indices))
-        a_dependant_vec = np.zeros(len(dependent_dof_indices))
-
-        free_index_map = {dof: idx for idx, dof in enumerate(free_dof_indices)}
-        fixed_index_map = {dof: idx for idx, dof in enumerate(fixed_dof_indices)}
-        dependent_index_map = {dof: idx for idx, dof in enumerate(dependent_dof_indices)}
-
-        for node_idx, node in enumerate(self.truss.nodes):
-            base_dof = node_idx * 2
-            loads = [node.load_x, node.load_y]
-            deformations = [node.deformation_x, node.deformation_y]
-            eigenstrains = node.eigenstrain
-
-            for direction, (load, deformation, eigenstrain) in enumerate(zip(loads, deformations, eigenstrains)):
-                global_dof = base_dof + direction
-
-                if global_dof in free_index_map:
-                    u_reduced[free_index_map[global_dof]] = deformation
-                    f_vec[free_index_map[global_dof]] = load
-                elif global_dof in dependent_index_map:
-                    f_vec[len(free_dof_indices) + dependent_index_map[global_dof]] = load
-                    a_dependant_vec[dependent_index_map[global_dof]] = eigenstrain
-                elif global_dof in fixed_index_map:
-                    u_reduced[len(free_dof_indices) + fixed_index_map[global_dof]] = deformation
-
-        u_vec = x_mat.dot(u_reduced)
-
-        # split u_vec into free and fixed parts
-        u_fixed = u_vec[len(free_dof_indices) + len(dependent_dof_indices):]
-
-        f_1 = f_vec[:len(free_dof_indices)]
-        f_D = f_vec[len(free_dof_indices):len(free_dof_indices) + len(dependent_dof_indices)]
-
-        # now we need to assemble the global stiffness matrix K
-        # we will divide it into 3 parts:
-        # K11 - free DOFs, K1D - dependent DOFs, K12 - fixed DOFs, only the horizontal part is needed
-
-        raw_K_matrix = lil_matrix((total_dof_count, total_dof_count))
+        The offsets of all cases come from one product with the truss' eigenstrain operator, and the
+        sensitivities (if requested) follow the offsets of moved nodes.
+        """
+        macro_strains = np.atleast_2d(macro_strains)
+        return self.solve_eigenstrains(
+            self.truss.macro_eigenstrains(macro_strains), compute_sensitivities, macro_strains
+        )
+
+    def solve_eigenstrains(
+            self,
+            eigenstrains: np.ndarray,
+            compute_sensitivities: bool = False,
+            macro_strains: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Solve several eigenstrain load cases with a single factorization of the reduced stiffness.
+
+        eigenstrains holds the per-node eigenstrain offsets of every case, shape (cases, nodes, 2),
+        laid out like Node.eigenstrain. Loads and prescribed deformations are shared by all cases.
+        Returns the homogenized stresses (xx, yy, xy) of each case as columns, shape (3, cases).
+        The displacement vectors (dofs, cases) and element axial forces (elements, cases) of the
+        solution are kept in displacements and axial_forces; Node/Element objects are not modified.
+
+        With compute_sensitivities the derivatives of the returned stresses with respect to the element
+        areas, Young's moduli and node coordinates are stored in sensitivities, computed with the adjoint
+        method: the three adjoint systems share the factorization (or CG setup) of the load cases, so the
+        full gradient costs about one extra solve. The eigenstrain offsets only follow moved nodes if the
+        macro strains (cases, 3) as (x, y, angle) that produced them are given; the volume is held fixed.
+        """
+        recorder = self._recorder
+        recorder.start()
+        recorder.stats.phases.extend(self._setup_phases)
+        self._setup_phases = []
+        try:
+            result = self._solve_eigenstrains(eigenstrains, compute_sensitivities, macro_strains)
+        finally:
+            stats = recorder.stop()
+        if recorder.enabled:
+            self.stats = stats
+        return result
+
+    def _solve_eigenstrains(
+            self,
+            eigenstrains: np.ndarray,
+            compute_sensitivities: bool,
+            macro_strains: Optional[np.ndarray],
+    ) -> np.ndarray:
+        recorder = self._recorder
+        constraints = self.constraints
+        total_dof_count = constraints.total_dof_count
+
+        free_dof_indices = constraints.free_dofs
+        dependent_dof_indices = constraints.dependent_dofs
+        fixed_dof_indices = constraints.fixed_dofs
+
+        XD1 = constraints.XD1
+        XD2 = constraints.XD2
+        x_mat = constraints.X
+
+        with recorder.phase("load_cases") as phase:
+            loads = self.truss.loads.reshape(-1)
+            deformations = self.truss.deformations.reshape(-1)
+
+            # reduced displacement vector [free; fixed] and force vector [free; dependent]
+            u_reduced = np.concatenate([deformations[free_dof_indices], deformations[fixed_dof_indices]])
+            f_vec = np.concatenate([loads[free_dof_indices], loads[dependent_dof_indices]])
+
+            # eigenstrain offsets of the dependent DOFs, one column per load case,
+            # pushed through chained dependencies
+            a_dependant = constraints.offset_transfer @ (
+                eigenstrains.reshape(len(eigenstrains), total_dof_count)[:, dependent_dof_indices].T
+            )
+
+            free_count = len(free_dof_indices)
+            free_dependent_count = free_count + len(dependent_dof_indices)
+
+            u_vec = x_mat.dot(u_reduced)
+
+            # split u_vec into free and fixed parts
+            u_fixed = u_vec[free_dependent_count:]
+
+            # dependent DOFs are shifted by prescribed fixed deformations (through XD2) and by the eigenstrain
+            dependent_shift = (XD2 @ u_fixed)[:, np.newaxis] + a_dependant
+
+            coords, connectivity, E, A = element_arrays(self.truss)
+            cases = len(eigenstrains)
+
+            # the adjoint loads are the stress gradients, solved as extra right-hand sides next to the cases
+            adjoint_loads = None
+            if compute_sensitivities:
+                adjoint_loads = stress_displacement_gradient(coords, connectivity, E, A, self.truss.volume)
+            phase.count("cases", cases)
+
+        backend = resolve_backend(self.backend, free_count, self.dense_threshold, self.iterative_threshold)
+        if backend == "cg":
+            u_free_solved = self._solve_matrix_free(f_vec, dependent_shift, adjoint_loads)
+        else:
+            u_free_solved = self._solve_direct(f_vec, dependent_shift, backend, adjoint_loads)
+        u_free_solved, adjoint_free = u_free_solved[:, :cases], u_free_solved[:, cases:]
+
+        with recorder.phase("postprocess") as phase:
+            # Update the full displacement vectors, one column per case
+            u_vec_solved = np.zeros((total_dof_count, cases))
+            u_vec_solved[free_dof_indices] = u_free_solved
+            u_vec_solved[dependent_dof_indices] = XD1 @ u_free_solved + dependent_shift
+            u_vec_solved[fixed_dof_indices] = np.array(u_fixed).reshape(-1, 1)
+
+            self.displacements = u_vec_solved
+            self.axial_forces = axial_forces(coords, connectivity, E, A, u_vec_solved)
+            stress = homogenized_stress(coords, connectivity, self.axial_forces, self.truss.volume)
+            phase.count("elements", len(connectivity))
+
+        if compute_sensitivities:
+            with recorder.phase("sensitivities") as phase:
+                self.sensitivities = self._sensitivities(adjoint_loads, adjoint_free, macro_strains)
+                phase.count("adjoints", adjoint_free.shape[1])
+
+        return stress
+
+    def _sensitivities(
+            self,
+            adjoint_loads: np.ndarray,
+            adjoint_free: np.ndarray,
+            macro_strains: Optional[np.ndarray],
+    ) -> StressSensitivities:
+        constraints = self.constraints
+        coords, connectivity, E, A = element_arrays(self.truss)
+        deformations = self.truss.deformations.reshape(-1)
+
+        adjoints = constraints.free_transformation() @ adjoint_free
+
+        # the reduced right-hand side is T^T (f - K s) with the equivalent loads K d inside f,
+        # so the stiffness acts on T u_free + s - d; the fixed DOFs are not part of s
+        residuals = self.displacements.copy()
+        residuals[constraints.fixed_dofs] = 0
+        residuals -= deformations[:, np.newaxis]
+
+        sensitivities = element_sensitivities(
+            coords, connectivity, E, A, self.truss.volume, self.displacements, adjoints, residuals
+        )
+
+        if macro_strains is not None:
+            # a dependent offset shifts u directly (g) and loads the free DOFs through K (K adjoint),
+            # raw offsets reach the dependent DOFs through offset_transfer
+            blocks = element_stiffness_blocks(coords, connectivity, E, A)
+            shift_gradient = adjoint_loads - stiffness_product(blocks, element_dofs(connectivity), adjoints)
+            offset_weights = np.zeros_like(adjoint_loads)
+            offset_weights[constraints.dependent_dofs] = (
+                constraints.offset_transfer.T @ shift_gradient[constraints.dependent_dofs]
+            )
+            sensitivities.coords += eigenstrain_offset_sensitivities(
+                self.truss.node_count,
+                self.truss.dependent_dof,
+                self.truss.master_dof,
+                self.truss.master_eigenstrain,
+                np.asarray(macro_strains, dtype=float),
+                offset_weights,
+            )
+
+        return sensitivities
+
+    def _solve_direct(
+            self,
+            f_vec: np.ndarray,
+            dependent_shift: np.ndarray,
+            backend: str,
+            adjoint_loads: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        constraints = self.constraints
+        free_count = len(constraints.free_dofs)
+        free_dependent_count = free_count + len(constraints.dependent_dofs)
 
         """
-        K matrix structure:
+        K matrix structure, assembled directly in [free; dependent; fixed] order:
           +-------+-------+-------+
           │  K11  │  K1D  │  K12  │  <- Free
           +-------+-------+-------+
@@ -157,60 +280,94 @@ class TrussSolver:
           +-------+-------+-------+
             Free     Dep.   Fixed
         """
-
-        for element in self.truss.elements:
-            stiffness_matrix = element.stiffness()
-
-            # global DOF indices for this element
-            dofs = element.getDOFs()
-
-            # add to global stiffness matrix
-            for i in range(4):
-                for j in range(4):
-                    raw_K_matrix[dofs[i], dofs[j]] += stiffness_matrix[i, j]
-
-        raw_K_matrix = raw_K_matrix.tocsr()
-
-        # Partition K matrix according to DOF ordering
-        # convert index lists to numpy int arrays for indexing
-        free_idx = np.array(free_dof_indices, dtype=int)
-        dep_idx = np.array(dependent_dof_indices, dtype=int)
-
-        K11 = raw_K_matrix[free_idx][:, free_idx]
-        K1D = raw_K_matrix[free_idx][:, dep_idx]
-        KD1 = raw_K_matrix[dep_idx][:, free_idx]
-        KDD = raw_K_matrix[dep_idx][:, dep_idx]
-
-        assembled_K = K11 + XD1.T @ KD1 + K1D @ XD1 + XD1.T @ KDD @ XD1
-
-        assembled_F = -1 * ( (K1D @ XD2 + XD1.T @ KDD @ XD2) @ u_fixed + (K1D + XD1.T @ KDD) @ a_dependant_vec - f_1 - XD1.T @ f_D )
-
-        u_free_solved = spsolve(assembled_K, assembled_F)
-
-        # Update the full displacement vector
-        u_vec_solved = np.zeros(total_dof_count)
-        u_vec_solved[free_dof_indices] = u_free_solved
-        u_vec_solved[dependent_dof_indices] = XD1.dot(u_free_solved) + XD2.dot(u_fixed) + a_dependant_vec
-        u_vec_solved[fixed_dof_indices] = np.array(u_fixed).flatten()
-
-        stress_contributions = []
-
-        for element in self.truss.elements:
-            element.set_local_deformations(u_vec_solved)
-
-            forces = element.forces_vector()
-
-            value = element.magnitude() * element.axial_force() * np.multiply.outer(element.get_cos_sin(),element.get_cos_sin())
-            stress_contributions.append(value)
-
-        result = 1 / self.truss.volume * sum(stress_contributions)
-        # print("Result:")
-        # print(result)
-        
-        # Extract stress components (xx, yy, xy) from the 2x2 result matrix
-        return np.array([
-            result[0, 0],  # xx
-            result[1, 1],  # yy
-            result[0, 1] * 2  # xy
-        ])
-    
\ No newline at end of file
+        recorder = self._recorder
+
+        with recorder.phase("assembly") as phase:
+            dof_order = np.concatenate([constraints.free_dofs, constraints.dependent_dofs, constraints.fixed_dofs])
+            raw_K_matrix = assemble_truss_stiffness(self.truss, dof_order)
+            phase.matrix("K", raw_K_matrix)
+
+        with recorder.phase("reduction") as phase:
+            # only the free and dependent rows/columns take part in the reduction
+            K_FD = raw_K_matrix[:free_dependent_count, :free_dependent_count]
+
+            # T = [X11; XD1] maps free DOFs to free and dependent DOFs (the free columns of X)
+            T = constraints.X[:free_dependent_count, :free_count]
+
+            # assembled_K = K11 + XD1^T KD1 + K1D XD1 + XD1^T KDD XD1
+            assembled_K = (T.T @ K_FD @ T).tocsc()
+
+            # coupling of the shifted dependent DOFs (K1D, KDD) is moved to the right-hand side,
+            # f = [f_1; f_D] is reduced by T^T as well
+            shift = np.zeros((free_dependent_count, dependent_shift.shape[1]))
+            shift[free_count:] = dependent_shift
+            assembled_F = T.T @ (f_vec[:, np.newaxis] - K_FD @ shift)
+            if adjoint_loads is not None:
+                # assembled_K is symmetric, the adjoint systems use it as is
+                free_dependent_dofs = dof_order[:free_dependent_count]
+                assembled_F = np.hstack([assembled_F, T.T @ adjoint_loads[free_dependent_dofs]])
+            phase.matrix("K_reduced", assembled_K)
+
+        with recorder.phase("solve") as phase:
+            # assembled_K is the same for every case, factorize it once and solve all right-hand sides together
+            u_free_solved, self.backend_info = solve_direct(backend, assembled_K, assembled_F)
+            phase.count("right_hand_sides", assembled_F.shape[1])
+        return u_free_solved
+
+    def _solve_matrix_free(
+            self,
+            f_vec: np.ndarray,
+            dependent_shift: np.ndarray,
+            adjoint_loads: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        constraints = self.constraints
+        free_count = len(constraints.free_dofs)
+        recorder = self._recorder
+
+        with recorder.phase("assembly") as phase:
+            # K is never assembled, only the element blocks and the reduction operator
+            coords, connectivity, E, A = element_arrays(self.truss)
+            blocks = element_stiffness_blocks(coords, connectivity, E, A)
+            dofs = element_dofs(connectivity)
+            free_transformation = constraints.free_transformation()
+
+            operator = ElementOperator(blocks, dofs, free_transformation)
+            phase.count("elements", len(connectivity))
+            phase.matrix("T", free_transformation)
+
+        with recorder.phase("reduction") as phase:
+            # same right-hand side as the direct path, T^T (f - K s), with K s applied per element;
+            # s only holds the dependent shifts and f only the free and dependent loads
+            cases = dependent_shift.shape[1]
+            shift = np.zeros((constraints.total_dof_count, cases))
+            shift[constraints.dependent_dofs] = dependent_shift
+            f_global = np.zeros(constraints.total_dof_count)
+            f_global[constraints.free_dofs] = f_vec[:free_count]
+            f_global[constraints.dependent_dofs] = f_vec[free_count:]
+
+            K_shift = stiffness_product(blocks, dofs, shift)
+
+            assembled_F = free_transformation.T @ (f_global[:, np.newaxis] - K_shift)
+            if adjoint_loads is not None:
+                assembled_F = np.hstack([assembled_F, free_transformation.T @ adjoint_loads])
+            phase.count("right_hand_sides", assembled_F.shape[1])
+
+        with recorder.phase("solve") as phase:
+            u_free_solved, self.iterative_info = solve_cg(
+                operator,
+                assembled_F,
+                preconditioner=self.preconditioner,
+                tolerance=self.tolerance,
+                max_iterations=self.max_iterations,
+            )
+            phase.count("size", operator.shape[0])
+            phase.count("right_hand_sides", assembled_F.shape[1])
+        self.backend_info = BackendInfo(
+            backend="cg",
+            method=self.preconditioner,
+            size=operator.shape[0],
+            nnz=0,
+            setup_time=self.iterative_info.setup_time,
+            solve_time=self.iterative_info.solve_time,
+        )
+        return u_free_solved
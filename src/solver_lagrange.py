@@ -1,146 +1,162 @@
-from typing import List, Dict
+from typing import Callable, List, Optional
 
 import numpy as np
-from scipy.sparse import lil_matrix
-from scipy.sparse.linalg import spsolve
-from dataclasses import dataclass
-from utils import dump_matrix_to_csv
+from scipy.sparse import bmat, coo_matrix, csr_matrix
 
+from assembly import assemble_truss_stiffness, axial_forces, element_arrays, homogenized_stress
+from constraints import constraint_arrays, deduplicate_relations
+from instrumentation import PhaseRecorder, PhaseStats, SolveStats
+from linear_solver import BackendInfo, resolve_backend, solve_direct
 from models import TrussData
 
-@dataclass
-class FixedConstraint:
-    dof: int
-    value: float = 0.0
-
-@dataclass
-class DependentConstraint:
-    dof: int
-    coeffs: Dict[int, float]
-    eigenstrain: np.ndarray
 
 class LagrangeTrussSolver:
     lambdas: List[float]
-    def __init__(self, truss: TrussData):
+    displacements: np.ndarray
+    axial_forces: np.ndarray
+    backend_info: Optional[BackendInfo] = None
+    stats: Optional[SolveStats] = None
+    def __init__(
+            self,
+            truss: TrussData,
+            backend: str = "auto",
+            dense_threshold: Optional[int] = None,
+            iterative_threshold: Optional[int] = None,
+            instrument: bool = False,
+            trace_memory: bool = False,
+            on_phase: Optional[Callable[[PhaseStats], None]] = None,
+    ):
+        """
+        backend "dense" (LAPACK LU) or "sparse" (SuperLU) for the KKT system, or "auto" to pick one
+        by its size like TrussSolver does. The KKT matrix is indefinite, so CG is never used; systems
+        above the iterative threshold stay on the sparse direct solver.
+        instrument, trace_memory and on_phase record the phases of every solve (constraints, assembly,
+        solve, postprocess) in stats like TrussSolver does.
+        """
+        if backend not in ("auto", "dense", "sparse"):
+            raise ValueError(f"Unknown backend '{backend}', expected 'auto', 'dense' or 'sparse'")
+
         self.truss = truss
+        self.backend = backend
+        self.dense_threshold = dense_threshold
+        self.iterative_threshold = iterative_threshold
+        self._recorder = PhaseRecorder(instrument, trace_memory, on_phase)
+
+    def constraint_matrix(self) -> tuple[csr_matrix, np.ndarray, np.ndarray]:
+        """
+        Build the constraint matrix C from arrays.
+
+        Rows are the fixed DOFs (u = deformation) followed by the dependent DOFs
+        (u - sum(factor * u_master) = eigenstrain), both in global DOF order.
+        Returns C and the DOFs the fixed and dependent rows belong to.
+        """
+        total_dof_count = self.truss.total_dof_count
+        constrained, dependent_dof, master_dof, factor = constraint_arrays(self.truss)
+        dependent_dof, master_dof, factor = deduplicate_relations(total_dof_count, dependent_dof, master_dof, factor)
+
+        fixed_dofs = np.flatnonzero(constrained)
+        dependent_dofs = np.unique(dependent_dof)
+
+        fixed_count = len(fixed_dofs)
+        dependent_rows = fixed_count + np.searchsorted(dependent_dofs, dependent_dof)
+
+        rows = np.concatenate([
+            np.arange(fixed_count),  # fixed constraints
+            fixed_count + np.arange(len(dependent_dofs)),  # dependent DOF itself
+            dependent_rows,  # its masters
+        ])
+        cols = np.concatenate([fixed_dofs, dependent_dofs, master_dof])
+        values = np.concatenate([
+            np.ones(fixed_count),
+            np.ones(len(dependent_dofs)),
+            -factor,  # negative for masters
+        ])
+
+        C = coo_matrix(
+            (values, (rows, cols)),
+            shape=(fixed_count + len(dependent_dofs), total_dof_count),
+        ).tocsr()
+        return C, fixed_dofs, dependent_dofs
 
     def solve(self) -> np.ndarray:
-
-        total_dof_count = len(self.truss.nodes) * 2
-        fixedConstraints: List[FixedConstraint] = []
-        dependentConstraints: List[DependentConstraint] = []
-        f = np.zeros(total_dof_count)
-
-        for node in self.truss.nodes:
-            base_dof = node.index * 2
-            if node.constrained_x:
-                fixedConstraints.append(FixedConstraint(dof=base_dof, value=node.deformation_x))
-            if node.constrained_y:
-                fixedConstraints.append(FixedConstraint(dof=base_dof + 1, value=node.deformation_y))
-            # f vector
-            f[base_dof] = node.load_x
-            f[base_dof + 1] = node.load_y
-
-        #print(f)
-
-        for node in self.truss.nodes:
-            base_dof = node.index * 2
-            if node.dependency:
-                # X direction
-                if node.dependency.dependant_x:
-                    x_dof = base_dof
-                    coeffs = {}
-                    eigenstrain = node.eigenstrain[0]  # From node.eigenstrain (assumed [x, y])
-                    for master in node.dependency.masters:
-                        if master.direction == 0:  # X direction
-                            master_dof = master.nodeIndex * 2
-                            coeffs[master_dof] = master.factor
-                    dependentConstraints.append(DependentConstraint(
-                        dof=x_dof,
-                        eigenstrain=eigenstrain,
-                        coeffs=coeffs,
-                    ))
-
-                # Y direction
-                if node.dependency.dependant_y:
-                    y_dof = base_dof + 1
-                    coeffs = {}
-                    eigenstrain = node.eigenstrain[1]
-                    for master in node.dependency.masters:
-                        if master.direction == 1:  # Y direction
-                            master_dof = master.nodeIndex * 2 + 1
-                            coeffs[master_dof] = master.factor
-                    dependentConstraints.append(DependentConstraint(
-                        dof=y_dof,
-                        eigenstrain=eigenstrain,
-                        coeffs=coeffs,
-                    ))
-
-        num_constraints = len(fixedConstraints) + len(dependentConstraints)
-
-        g = np.zeros(num_constraints)
-
-        K = lil_matrix((total_dof_count, total_dof_count))
-        for element in self.truss.elements:
-            stiffness_matrix = element.stiffness()  # 4x4 matrix from element
-            dofs = element.getDOFs()  # List of 4 global DOF indices
-            for i in range(4):
-                for j in range(4):
-                    K[dofs[i], dofs[j]] += stiffness_matrix[i, j]  # Accumulate (handles overlapping elements)
-        K = K.tocsr()  # Convert to CSR for efficient operations
-
-        C = lil_matrix((num_constraints, total_dof_count))
-        row = 0
-        # Fixed constraints
-        for constraint in fixedConstraints:
-            C[row, constraint.dof] = 1
-            g[row] = constraint.value
-            row += 1
-        # Dependent constraints (keep existing loop, but update row)
-        for constraint in dependentConstraints:
-            C[row, constraint.dof] = 1
-            for master_dof, factor in constraint.coeffs.items():
-                C[row, master_dof] = -factor  # Fix: negative for masters
-            g[row] = constraint.eigenstrain
-            row += 1
-
-        C = C.tocsr()
-        f_aug = np.concatenate([f, g])
-
-        aug_size = total_dof_count + num_constraints
-        K_aug = lil_matrix((aug_size, aug_size))
-        K_aug[:total_dof_count, :total_dof_count] = K
-        K_aug[:total_dof_count, total_dof_count:] = C.T  # Remove * -1
-        K_aug[total_dof_count:, :total_dof_count] = C
-        K_aug = K_aug.tocsr()
-
-        u_aug = spsolve(K_aug, f_aug)
-
-        u_vec_solved = u_aug[:total_dof_count]
-
-        self.lambdas = u_aug[total_dof_count:]
-
-        #dump_matrix_to_csv(K_aug, "debug_export.csv")
-
-        stress_contributions = []
-
-        for element in self.truss.elements:
-            element.set_local_deformations(u_vec_solved)
-
-            value = (
-                element.magnitude()
-                * element.axial_force()
-                * np.multiply.outer(element.get_cos_sin(), element.get_cos_sin())
-            )
-            stress_contributions.append(value)
-
-        result = 1 / self.truss.volume * sum(stress_contributions)
-
-        # Extract stress components (xx, yy, xy) from the 2x2 result matrix
-        return np.array(
-            [
-                result[0, 0],  # xx
-                result[1, 1],  # yy
-                result[0, 1] * 2,  # xy
-            ]
-        )
+        result = self.solve_eigenstrains(self.truss.eigenstrain[np.newaxis])[:, 0]
+        self.lambdas = self.lambdas[:, 0]
+        self.displacements = self.displacements[:, 0]
+        self.axial_forces = self.axial_forces[:, 0]
+        return result
+
+    def solve_macro_strains(self, macro_strains: np.ndarray) -> np.ndarray:
+        """solve_eigenstrains for macroscopic eigenstrains (cases, 3) as (x, y, angle), e.g. eigenstrainSets."""
+        return self.solve_eigenstrains(self.truss.macro_eigenstrains(macro_strains))
+
+    def solve_eigenstrains(self, eigenstrains: np.ndarray) -> np.ndarray:
+        """
+        Solve several eigenstrain load cases with one factorization of the KKT system.
+
+        eigenstrains holds per-node offsets of shape (cases, nodes, 2), laid out like Node.eigenstrain.
+        Returns the homogenized stresses (xx, yy, xy) as columns, shape (3, cases); the Lagrange
+        multipliers of all cases are kept in lambdas as a (constraints, cases) matrix.
+        """
+        recorder = self._recorder
+        recorder.start()
+        try:
+            result = self._solve_eigenstrains(eigenstrains)
+        finally:
+            stats = recorder.stop()
+        if recorder.enabled:
+            self.stats = stats
+        return result
+
+    def _solve_eigenstrains(self, eigenstrains: np.ndarray) -> np.ndarray:
+        recorder = self._recorder
+        total_dof_count = self.truss.total_dof_count
+        cases = len(eigenstrains)
+
+        f = self.truss.loads.reshape(-1)
+        deformations = self.truss.deformations.reshape(-1)
+
+        with recorder.phase("constraints") as phase:
+            C, fixed_dofs, dependent_dofs = self.constraint_matrix()
+            num_constraints = C.shape[0]
+            phase.matrix("C", C)
+
+        with recorder.phase("assembly") as phase:
+            K = assemble_truss_stiffness(self.truss)
+
+            """
+            KKT system:
+              +-------+-------+   +--------+   +---+
+              │   K   │  C^T  │   │   u    │   │ f │
+              +-------+-------+ x +--------+ = +---+
+              │   C   │   0   │   │ lambda │   │ g │
+              +-------+-------+   +--------+   +---+
+            """
+            K_aug = bmat([[K, C.T], [C, None]], format="csc")
+
+            # right-hand sides of all cases, only the eigenstrain part of g differs between them
+            f_aug = np.zeros((total_dof_count + num_constraints, cases))
+            f_aug[:total_dof_count] = f[:, np.newaxis]
+            f_aug[total_dof_count:total_dof_count + len(fixed_dofs)] = deformations[fixed_dofs, np.newaxis]
+            f_aug[total_dof_count + len(fixed_dofs):] = eigenstrains.reshape(cases, total_dof_count)[:, dependent_dofs].T
+            phase.matrix("K", K)
+            phase.matrix("K_aug", K_aug)
+
+        with recorder.phase("solve") as phase:
+            # the KKT matrix is indefinite, LU with pivoting handles it; factorized once for all cases
+            backend = resolve_backend(self.backend, K_aug.shape[0], self.dense_threshold, self.iterative_threshold)
+            if backend == "cg":
+                backend = "sparse"
+            u_aug, self.backend_info = solve_direct(backend, K_aug, f_aug, positive_definite=False)
+            phase.count("right_hand_sides", cases)
+
+        with recorder.phase("postprocess") as phase:
+            u_vec_solved = u_aug[:total_dof_count]
+
+            self.lambdas = u_aug[total_dof_count:]
+
+            coords, connectivity, E, A = element_arrays(self.truss)
+            self.displacements = u_vec_solved
+            self.axial_forces = axial_forces(coords, connectivity, E, A, u_vec_solved)
+            stress = homogenized_stress(coords, connectivity, self.axial_forces, self.truss.volume)
+            phase.count("elements", len(connectivity))
+        return stress
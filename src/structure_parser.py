@@ -1,11 +1,14 @@
 import json
+import os
 from typing import List, Optional, Tuple, Dict, Any
 from dataclasses import dataclass, field
 
 import numpy as np
-import math
 
-from models import TrussData, Node, Dependency, MasterNode, Element 
+from assembly import element_dofs, element_stiffness_blocks
+from eigenstrain import eigenstrain_operator, macro_strain_coefficients
+from expressions import parse_expression
+from models import TrussData
 
 
 @dataclass
@@ -62,8 +65,8 @@ class StructureDefinition:
         nodes = []
         for node_data in data.get("nodes", []):
             nodes.append(NodeDefinition(
-                dx=eval(node_data["dx"]),  # Still need eval for fractions
-                dy=eval(node_data["dy"]),
+                dx=parse_expression(node_data["dx"]),
+                dy=parse_expression(node_data["dy"]),
                 constraints=node_data.get("constraints", ""),
                 deformations=node_data.get("deformations", {}),
                 loads=node_data.get("loads", {})
@@ -115,43 +118,165 @@ class StructureDefinition:
         return parse_structure_data(self, explicitEigenStrain) 
 
 
-def parse_structure_data(definition: StructureDefinition, explicitEigenStrain: Optional[np.ndarray] = None) -> TrussData:
-    total_constraints = 0
-    
+def structure_arrays(definition: StructureDefinition) -> Dict[str, np.ndarray]:
+    """
+    Array form of a structure definition, one entry per TrussData array field.
+
+    Defaults for E and A are resolved; loads are the given ones, without the equivalent loads of
+    prescribed deformations, which truss_from_arrays adds.
+    """
     default_E = definition.defaultYoungsModulus
     default_A = definition.defaultCrossSectionArea
 
-    nodes: List[Node] = []
-    for i, node_def in enumerate(definition.nodes):
-        constraints = node_def.constraints
-        constrained_x = "x" in constraints
-        constrained_y = "y" in constraints
-
-        total_constraints += int(constrained_x) + int(constrained_y)
-
-        deformations = node_def.deformations
-        deformation_x = deformations.get("x", 0.0)
-        deformation_y = deformations.get("y", 0.0)
-
-        loads = node_def.loads
-        load_x = loads.get("x", 0.0)
-        load_y = loads.get("y", 0.0)
-
-        new_node = Node(
-            index=i,
-            dx=node_def.dx,
-            dy=node_def.dy,
-            constrained_x=constrained_x,
-            constrained_y=constrained_y,
-            deformation_x=deformation_x,
-            deformation_y=deformation_y,
-            load_x=load_x,
-            load_y=load_y,
-            eigenstrain=np.array([0.0, 0.0]),
+    node_defs = definition.nodes
+    coords = np.array([(node_def.dx, node_def.dy) for node_def in node_defs], dtype=float).reshape(-1, 2)
+    constrained = np.array(
+        [("x" in node_def.constraints, "y" in node_def.constraints) for node_def in node_defs], dtype=bool
+    ).reshape(-1, 2)
+    deformations = np.array(
+        [(node_def.deformations.get("x", 0.0), node_def.deformations.get("y", 0.0)) for node_def in node_defs],
+        dtype=float,
+    ).reshape(-1, 2)
+    loads = np.array(
+        [(node_def.loads.get("x", 0.0), node_def.loads.get("y", 0.0)) for node_def in node_defs],
+        dtype=float,
+    ).reshape(-1, 2)
+
+    connectivity = np.array(
+        [(elem_def.starting_node, elem_def.ending_node) for elem_def in definition.elements], dtype=np.int64
+    ).reshape(-1, 2)
+    E = np.array(
+        [elem_def.E if elem_def.E is not None else default_E for elem_def in definition.elements], dtype=float
+    )
+    A = np.array(
+        [elem_def.A if elem_def.A is not None else default_A for elem_def in definition.elements], dtype=float
+    )
+
+    relations = []
+    for dep_def in definition.dependencies:
+        if len(dep_def.masters) == 0:
+            print(f"Warning: Dependency for node {dep_def.node} has no masters.")
+            continue
+
+        for master_def in dep_def.masters:
+            direction = 0 if master_def.direction == "x" else 1
+            relations.append((
+                dep_def.node * 2 + direction,
+                master_def.node * 2 + direction,
+                master_def.factor,
+                master_def.eigenstrain,
+            ))
+
+    return {
+        "coords": coords,
+        "connectivity": connectivity,
+        "E": E,
+        "A": A,
+        "constrained": constrained,
+        "deformations": deformations,
+        "loads": loads,
+        "dependent_dof": np.array([relation[0] for relation in relations], dtype=np.int64),
+        "master_dof": np.array([relation[1] for relation in relations], dtype=np.int64),
+        "master_factor": np.array([relation[2] for relation in relations], dtype=float),
+        "master_eigenstrain": np.array([relation[3] for relation in relations], dtype=bool),
+    }
+
+
+def structure_from_arrays(arrays: Dict[str, np.ndarray], volume: Optional[float] = None) -> StructureDefinition:
+    """
+    StructureDefinition of structure_arrays style arrays, the inverse of structure_arrays; lets
+    array-built structures use everything that takes a definition (cache, sweep, JSON export).
+    """
+    axes = ("x", "y")
+    nodes = [
+        NodeDefinition(
+            dx=dx,
+            dy=dy,
+            constraints="".join(axis for axis, fixed in zip(axes, fixed_xy) if fixed),
+            deformations={axis: value for axis, value in zip(axes, deformation) if value != 0},
+            loads={axis: value for axis, value in zip(axes, load) if value != 0},
+        )
+        for (dx, dy), fixed_xy, deformation, load in zip(
+            arrays["coords"].tolist(), arrays["constrained"].tolist(),
+            arrays["deformations"].tolist(), arrays["loads"].tolist(),
         )
+    ]
+    elements = [
+        ElementDefinition(starting_node=start, ending_node=end, E=E, A=A)
+        for (start, end), E, A in zip(arrays["connectivity"].tolist(), arrays["E"].tolist(), arrays["A"].tolist())
+    ]
+
+    masters = {}
+    for dependent, master, factor, eigenstrain in zip(
+            arrays["dependent_dof"].tolist(), arrays["master_dof"].tolist(),
+            arrays["master_factor"].tolist(), arrays["master_eigenstrain"].tolist(),
+    ):
+        masters.setdefault(dependent // 2, []).append(
+            MasterDefinition(node=master // 2, direction=axes[master % 2], factor=factor, eigenstrain=eigenstrain)
+        )
+    dependencies = [DependencyDefinition(node=node, masters=node_masters) for node, node_masters in masters.items()]
+
+    return StructureDefinition(nodes=nodes, elements=elements, dependencies=dependencies, volume=volume)
+
+
+def truss_from_arrays(
+        arrays: Dict[str, np.ndarray],
+        volume: Optional[float],
+        eigenstrain_vector: np.ndarray,
+) -> TrussData:
+    """
+    Build a TrussData from structure_arrays style arrays without creating any per-node objects.
+
+    The arrays are used as they are (memory-mapped ones included), only the loads are copied to
+    add the equivalent loads of prescribed deformations. A missing volume is taken from the extent
+    of the nodes.
+    """
+    coords = arrays["coords"]
+    connectivity = arrays["connectivity"]
+    E = arrays["E"]
+    A = arrays["A"]
+    constrained = arrays["constrained"]
+    deformations = arrays["deformations"]
+    loads = np.array(arrays["loads"], dtype=float)
+
+    # Calculate volume if not provided
+    if volume is None:
+        extent = coords.max(axis=0) - coords.min(axis=0)
+        volume = float(extent[0] * extent[1])
+
+    # prescribed deformations act as equivalent nodal loads K_e @ d_e of the touching elements
+    element_deformations = deformations[connectivity].reshape(-1, 4)
+    deformed = np.any(element_deformations != 0, axis=1)
+    if np.any(deformed):
+        blocks = element_stiffness_blocks(coords, connectivity[deformed], E[deformed], A[deformed])
+        forces = np.einsum("eij,ej->ei", blocks, element_deformations[deformed])
+        np.add.at(loads.reshape(-1), element_dofs(connectivity[deformed]).ravel(), forces.ravel())
+
+    # built once, every other macroscopic eigenstrain is one more product with it (TrussData.macro_eigenstrains)
+    operator = eigenstrain_operator(
+        coords, arrays["dependent_dof"], arrays["master_dof"], arrays["master_eigenstrain"]
+    )
+
+    return TrussData(
+        coords=coords,
+        connectivity=connectivity,
+        E=E,
+        A=A,
+        constrained=constrained,
+        deformations=deformations,
+        loads=loads,
+        eigenstrain=(operator @ macro_strain_coefficients(eigenstrain_vector)).reshape(-1, 2),
+        dependent_dof=arrays["dependent_dof"],
+        master_dof=arrays["master_dof"],
+        master_factor=arrays["master_factor"],
+        master_eigenstrain=arrays["master_eigenstrain"],
+        constrained_dofs_count=int(constrained.sum()),
+        volume=volume,
+        eigenstrain_operator=operator,
+    )
 
-        nodes.append(new_node)
 
+def parse_structure_data(definition: StructureDefinition, explicitEigenStrain: Optional[np.ndarray] = None) -> TrussData:
     if explicitEigenStrain is not None:
         eigenstrain_vector = explicitEigenStrain
     else:
@@ -161,73 +286,119 @@ def parse_structure_data(definition: StructureDefinition, explicitEigenStrain: O
             definition.eigenstrain.angle
         ])
 
-    for dep_def in definition.dependencies:
-        node_index = dep_def.node
-        node = nodes[node_index]
-        
-        if len(dep_def.masters) == 0:
-            print(f"Warning: Dependency for node {node_index} has no masters.")
-            continue
-
-        if node.dependency is None:
-            node.dependency = Dependency(
-                masters=[],
-                dependant_x=False,
-                dependant_y=False,
-                dependency_index=len(definition.dependencies)  # Use index in list
-            )
-
-        for master_def in dep_def.masters:
-            direction = 0 if master_def.direction == "x" else 1
-
-            if direction == 0:
-                node.dependency.dependant_x = True
-            else:
-                node.dependency.dependant_y = True
-
-            if master_def.eigenstrain:
-                master_node = nodes[master_def.node]
+    return truss_from_arrays(structure_arrays(definition), definition.volume, eigenstrain_vector)
 
-                if direction == 0:  # x direction
-                    node.eigenstrain[0] += -1 * ((master_node.dx - node.dx) * eigenstrain_vector[0] + math.tan(eigenstrain_vector[2])/2 * (master_node.dy - node.dy))
-                else:  # y direction
-                    node.eigenstrain[1] += -1 * ((master_node.dy - node.dy) * eigenstrain_vector[1] + math.tan(eigenstrain_vector[2])/2 * (master_node.dx - node.dx))
 
-            master_nodes = MasterNode(
-                nodeIndex=master_def.node,
-                factor=master_def.factor,
-                direction=direction
-            )
+def read_json_file(file_path: str) -> StructureDefinition:
+    with open(file_path) as f:
+        data = json.load(f)
+    return StructureDefinition.from_json_dict(data)
 
-            node.dependency.masters.append(master_nodes)
 
-    # Calculate volume if not provided
-    if definition.volume is not None:
-        volume = definition.volume
+def parse_json_file(file_path: str, explicitEigenStrain: Optional[np.ndarray] = None) -> TrussData:
+    definition = read_json_file(file_path)
+    return parse_structure_data(definition, explicitEigenStrain)
+
+# the binary format is a directory with one .npy file per array and a small JSON header
+BINARY_FORMAT = "stm-structure"
+BINARY_VERSION = 1
+BINARY_HEADER = "header.json"
+BINARY_ARRAYS = (
+    "coords",
+    "connectivity",
+    "E",
+    "A",
+    "constrained",
+    "deformations",
+    "loads",
+    "dependent_dof",
+    "master_dof",
+    "master_factor",
+    "master_eigenstrain",
+)
+
+
+def write_binary_structure(definition: StructureDefinition, directory: str) -> None:
+    """
+    Store a structure in the binary format, readable with parse_binary_file.
+
+    The header records the counts, the volume (null if it is taken from the node extent) and the
+    default eigenstrain (x, y, angle); it is written last, so an interrupted write is not loadable.
+    """
+    arrays = structure_arrays(definition)
+    os.makedirs(directory, exist_ok=True)
+
+    header_path = os.path.join(directory, BINARY_HEADER)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    for name in BINARY_ARRAYS:
+        np.save(os.path.join(directory, name + ".npy"), arrays[name])
+
+    header = {
+        "format": BINARY_FORMAT,
+        "version": BINARY_VERSION,
+        "node_count": len(arrays["coords"]),
+        "element_count": len(arrays["connectivity"]),
+        "relation_count": len(arrays["dependent_dof"]),
+        "volume": definition.volume,
+        "eigenstrain": [definition.eigenstrain.x, definition.eigenstrain.y, definition.eigenstrain.angle],
+    }
+    with open(header_path, "w") as f:
+        json.dump(header, f, indent=2)
+
+
+def convert_json_file(json_path: str, directory: str) -> None:
+    """Convert a structure of the JSON schema to the binary format."""
+    write_binary_structure(read_json_file(json_path), directory)
+
+
+def read_binary_header(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, BINARY_HEADER)) as f:
+        header = json.load(f)
+    if header.get("format") != BINARY_FORMAT or header.get("version") != BINARY_VERSION:
+        raise ValueError(f"{directory} is not a {BINARY_FORMAT} version {BINARY_VERSION} structure")
+    return header
+
+
+def load_binary_arrays(directory: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """The arrays of a binary structure, memory-mapped unless mmap is False."""
+    header = read_binary_header(directory)
+    arrays = {}
+    for name in BINARY_ARRAYS:
+        arrays[name] = np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None)
+
+    expected = {
+        "coords": header["node_count"],
+        "connectivity": header["element_count"],
+        "dependent_dof": header["relation_count"],
+    }
+    for name, count in expected.items():
+        if len(arrays[name]) != count:
+            raise ValueError(f"{directory}: {name} holds {len(arrays[name])} rows, the header {count}")
+    return arrays
+
+
+def parse_binary_file(directory: str, explicitEigenStrain: Optional[np.ndarray] = None) -> TrussData:
+    """
+    Binary counterpart of parse_json_file.
+
+    The arrays are memory-mapped and handed to the solvers as they are; no per-node objects are
+    created, only the loads and the eigenstrain offsets are computed in memory.
+    """
+    header = read_binary_header(directory)
+    if explicitEigenStrain is not None:
+        eigenstrain_vector = explicitEigenStrain
     else:
-        max_x = max(node.dx for node in nodes)
-        max_y = max(node.dy for node in nodes)
-        min_x = min(node.dx for node in nodes)
-        min_y = min(node.dy for node in nodes)
-        volume = (max_x - min_x) * (max_y - min_y)
+        eigenstrain_vector = np.array(header["eigenstrain"], dtype=float)
 
-    elements = [
-        Element(
-            nodes=(
-                nodes[elem_def.starting_node],
-                nodes[elem_def.ending_node],
-            ),
-            E=elem_def.E if elem_def.E is not None else default_E,
-            A=elem_def.A if elem_def.A is not None else default_A
-        )
-        for elem_def in definition.elements
-    ]
+    return truss_from_arrays(load_binary_arrays(directory), header["volume"], eigenstrain_vector)
 
-    return TrussData(nodes, elements, total_constraints, volume)
 
+if __name__ == "__main__":
+    import sys
 
-def parse_json_file(file_path: str, explicitEigenStrain: Optional[np.ndarray] = None) -> TrussData:
-    with open(file_path) as f:
-        data = json.load(f)
-    definition = StructureDefinition.from_json_dict(data)
-    return parse_structure_data(definition, explicitEigenStrain)
\ No newline at end of file
+    if len(sys.argv) != 3:
+        print("usage: python structure_parser.py <structure.json> <output directory>")
+        sys.exit(1)
+    convert_json_file(sys.argv[1], sys.argv[2])
@@ -0,0 +1,226 @@
+import itertools
+import json
+import math
+import os
+import time
+from multiprocessing import Pool
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from batch_solver import TopologyMismatchError
+from cache import HomogenizationCache
+from material_fit import FIT_METHODS, fit_iso, fit_orto
+from parameter_solver import homogenize, homogenize_batch
+from structure_parser import StructureDefinition
+
+# a pool task that solves less than this many cells spends most of its time in IPC
+MIN_CHUNKSIZE = 8
+# structures up to this many DOFs are solved as one batch (BatchTrussSolver), larger ones one by
+# one with homogenize; around here the dense batched solve stops beating the sparse single solves
+BATCH_DOF_THRESHOLD = 200
+
+FITS = {
+    "orto": (fit_orto, ("Ex", "Ey", "vxy", "vyx", "Gxy")),
+    "iso": (fit_iso, ("E", "v")),
+}
+
+
+def default_chunksize(total: int, workers: int) -> int:
+    # about four chunks per worker keeps the load balanced when some chunks run slower
+    return max(MIN_CHUNKSIZE, math.ceil(total / (workers * 4)))
+
+
+def grid_size(grid: Dict[str, Sequence[Any]]) -> int:
+    return math.prod(len(values) for values in grid.values())
+
+
+def grid_points(grid: Dict[str, Sequence[Any]], start: int = 0) -> Iterator[tuple]:
+    """Points of the full grid from flat index start on, the last parameter varies fastest."""
+    return itertools.islice(itertools.product(*grid.values()), start, None)
+
+
+def solve_points(task: tuple) -> np.ndarray:
+    """
+    Fitted material parameters of a chunk of grid points, shape (points, fit parameters).
+
+    Small generated structures (up to BATCH_DOF_THRESHOLD DOFs) sharing one topology are solved as
+    one batch; larger ones, and all of them if the generator changes the topology within the chunk
+    (e.g. a node count parameter), are solved one by one.
+    """
+    generator, fixed, names, points, fit, method, cache = task
+    structures = [generator(**fixed, **dict(zip(names, point))) for point in points]
+
+    Ds = np.empty((len(structures), 3, 3))
+    dof_counts = np.array([2 * len(structure.nodes) for structure in structures])
+    small = np.flatnonzero(dof_counts <= BATCH_DOF_THRESHOLD)
+    single = np.flatnonzero(dof_counts > BATCH_DOF_THRESHOLD)
+
+    if len(small):
+        try:
+            Ds[small] = homogenize_batch([structures[index] for index in small], cache)
+        except TopologyMismatchError:
+            single = np.arange(len(structures))
+    for index in single:
+        Ds[index] = homogenize(structures[index], cache)
+
+    return FITS[fit][0](Ds, method)
+
+
+def iterate_sweep(
+        generator: Callable[..., StructureDefinition],
+        grid: Dict[str, Sequence[Any]],
+        fixed: Optional[Dict[str, Any]] = None,
+        fit: str = "orto",
+        method: str = "least_squares",
+        workers: int = 1,
+        chunksize: Optional[int] = None,
+        start: int = 0,
+        verbose: bool = True,
+        cache: Optional[HomogenizationCache] = None,
+) -> Iterator[tuple[list, np.ndarray]]:
+    """
+    Solve the grid point by point from flat index start on, yielding (points, results) per chunk.
+
+    generator is called as generator(**fixed, **point) for every point of the grid, a dict from
+    generator argument name to the values it takes. With workers > 1 the chunks are spread over a
+    process pool; they are yielded in grid order either way, so only one chunk of results is held
+    in memory and the output does not depend on the worker count. All workers share the cache
+    directory if one is given.
+    """
+    if fit not in FITS:
+        raise ValueError(f"Unknown fit '{fit}', expected one of {tuple(FITS)}")
+    if method not in FIT_METHODS:
+        raise ValueError(f"Unknown fit method '{method}', expected one of {FIT_METHODS}")
+
+    fixed = fixed or {}
+    names = list(grid)
+    total = grid_size(grid)
+    remaining = total - start
+    if remaining <= 0:
+        return
+
+    workers = max(1, min(workers, remaining))
+    if chunksize is None:
+        chunksize = default_chunksize(remaining, workers)
+
+    def chunks() -> Iterator[list]:
+        points = grid_points(grid, start)
+        return iter(lambda: list(itertools.islice(points, chunksize)), [])
+
+    tasks = ((generator, fixed, names, chunk, fit, method, cache) for chunk in chunks())
+
+    done = start
+    start_time = time.perf_counter()
+
+    def report(chunk: list):
+        nonlocal done
+        done += len(chunk)
+        if verbose:
+            elapsed = time.perf_counter() - start_time
+            print(f"Solved {done}/{total} | {elapsed:.2f}s | {(done - start) / elapsed:.0f} cells/s", end="\r")
+
+    if workers == 1:
+        for task in tasks:
+            results = solve_points(task)
+            report(task[3])
+            yield task[3], results
+    else:
+        with Pool(workers) as pool:
+            # imap returns the results in task order, a second pass over the grid pairs them with their points
+            for chunk, results in zip(chunks(), pool.imap(solve_points, tasks)):
+                report(chunk)
+                yield chunk, results
+
+    if verbose:
+        print()
+
+
+def _checkpoint_path(output_path: str) -> str:
+    return output_path + ".checkpoint.json"
+
+
+def _write_checkpoint(path: str, checkpoint: dict) -> None:
+    # written next to the target and renamed, a crash never leaves a half written checkpoint
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
+
+
+def _truncate_lines(path: str, line_count: int) -> None:
+    """Cut a text file after line_count complete lines, dropping rows written past the checkpoint."""
+    with open(path, "rb+") as f:
+        offset = 0
+        for _ in range(line_count):
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                raise ValueError(f"{path} holds less rows than its checkpoint records")
+            offset += len(line)
+        f.truncate(offset)
+
+
+def run_sweep(
+        generator: Callable[..., StructureDefinition],
+        grid: Dict[str, Sequence[Any]],
+        output_path: str,
+        fixed: Optional[Dict[str, Any]] = None,
+        fit: str = "orto",
+        method: str = "least_squares",
+        workers: int = 1,
+        chunksize: Optional[int] = None,
+        resume: bool = True,
+        verbose: bool = True,
+        cache: Optional[HomogenizationCache] = None,
+) -> int:
+    """
+    Sweep a generator over a parameter grid, streaming one CSV row per grid point to output_path.
+
+    Every row holds the grid parameters followed by the fitted material parameters, below a header
+    line with the column names. Rows are appended and flushed chunk by chunk and a checkpoint
+    (output_path + ".checkpoint.json") records how many are complete. With resume an interrupted
+    sweep of the same generator, grid and fit continues after the last complete row; otherwise the
+    output is started over. Points already in the cache are not solved again.
+    Returns the number of rows solved by this call.
+    """
+    fixed = fixed or {}
+    grid = {name: np.asarray(values).tolist() for name, values in grid.items()}
+    checkpoint_path = _checkpoint_path(output_path)
+
+    # round tripped through JSON so a loaded checkpoint compares equal
+    sweep = json.loads(json.dumps({
+        "generator": generator.__name__,
+        "grid": grid,
+        "fixed": fixed,
+        "fit": fit,
+        "method": method,
+    }))
+
+    start = 0
+    if resume and os.path.exists(checkpoint_path) and os.path.exists(output_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint["sweep"] != sweep:
+            raise ValueError(f"{output_path} belongs to a different sweep, remove it or pass resume=False")
+        start = checkpoint["completed"]
+        # the header line and the complete rows are kept
+        _truncate_lines(output_path, start + 1)
+    else:
+        with open(output_path, "w") as f:
+            f.write(",".join(list(grid) + list(FITS[fit][1])) + "\n")
+        _write_checkpoint(checkpoint_path, {"sweep": sweep, "completed": 0})
+
+    completed = start
+    with open(output_path, "a") as f:
+        for points, results in iterate_sweep(
+                generator, grid, fixed, fit, method, workers, chunksize, start, verbose, cache
+        ):
+            rows = np.column_stack([np.array(points, dtype=float), results])
+            np.savetxt(f, rows, delimiter=",")
+            f.flush()
+            os.fsync(f.fileno())
+
+            completed += len(points)
+            _write_checkpoint(checkpoint_path, {"sweep": sweep, "completed": completed})
+
+    return completed - start
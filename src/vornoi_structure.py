@@ -1,106 +1,286 @@
 import math
-from random import uniform
+import warnings
 from time import perf_counter
 
 import numpy as np
 from scipy.spatial import Voronoi
 
+from models import TrussData
+from structure_parser import StructureDefinition, structure_from_arrays, truss_from_arrays
 
-def generateStructure(width, height, num_points, point_radius):
-    # In rect with width and height, generate num_points random points.
-    # Start with one random point, then for each next check if it is at least
-    # 2 * point_radius away from all existing points; if not, generate a new point.
-    # Limit attempts to 1000; if it fails to generate after that, return what we have.
-    expandedDomainPoints = []
-    innerPoints = []
-    
-    tile_offsets = (
-        (0.0, 0.0),
-        (width, 0.0),
-        (-width, 0.0),
-        (0.0, height),
-        (0.0, -height),
-        (width, height),
-        (-width, height),
-        (width, -height),
-        (-width, -height),
-    )
-    
-    attempts = 0
-    min_distance_squared = (2 * point_radius) ** 2
-    while len(innerPoints) < num_points and attempts < 1000:
-        x = uniform(0, width)
-        y = uniform(0, height)
-        new_point = (x, y)
-        if all(
-            (x - p[0]) ** 2 + (y - p[1]) ** 2 >= min_distance_squared for p in expandedDomainPoints
-        ):
-            innerPoints.append(new_point)
-            
-            for dx, dy in tile_offsets:
-                nx = x + dx
-                ny = y + dy
-                if nx >= 0 - 2*point_radius and nx <= width + 2*point_radius and ny >= 0 - 2*point_radius and ny <= height + 2*point_radius:
-                    expandedDomainPoints.append((nx, ny))
-            
-            attempts = 0  # reset attempts after a successful addition
-        else:
-            attempts += 1
-
-    
-
-    tiled_points = []
-    tiled_meta = []
-    for base_index, (x, y) in enumerate(innerPoints):
-        for dx, dy in tile_offsets:
-            tiled_points.append((x + dx, y + dy))
-            tiled_meta.append((base_index, dx, dy))
-
-    vor = Voronoi(np.array(tiled_points))
-
-    edges = []
-    periodic_edges = []
-    seen_edges = set()
-    seen_periodic = set()
-    print(vor.ridge_vertices[0])
-    print(vor.ridge_points[0:5])
-    print(vor.vertices[0:5])
-    for (p1, p2), ridge_vertices in zip(vor.ridge_points, vor.ridge_vertices):
-        if -1 in ridge_vertices:
-            continue
-        v0, v1 = vor.vertices[ridge_vertices]
-        ridge_length = math.hypot(v1[0] - v0[0], v1[1] - v0[1])
-
-        b1, dx1, dy1 = tiled_meta[p1]
-        b2, dx2, dy2 = tiled_meta[p2]
-
-        is_base_1 = dx1 == 0.0 and dy1 == 0.0
-        is_base_2 = dx2 == 0.0 and dy2 == 0.0
-        if not (is_base_1 or is_base_2):
-            continue
-
-        if is_base_1 and is_base_2:
-            key = (min(b1, b2), max(b1, b2))
-            if key not in seen_edges:
-                edges.append((b1, b2, ridge_length))
-                seen_edges.add(key)
-            continue
-
-        if is_base_1:
-            base_idx = b1
-            other_idx = b2
-            shift = (dx2 - dx1, dy2 - dy1)
+
+TILE_OFFSETS = (
+    (0.0, 0.0),
+    (1.0, 0.0),
+    (-1.0, 0.0),
+    (0.0, 1.0),
+    (0.0, -1.0),
+    (1.0, 1.0),
+    (-1.0, 1.0),
+    (1.0, -1.0),
+    (-1.0, -1.0),
+)
+
+# Bridson's k, candidates tried around an active point before it is retired
+POISSON_CANDIDATES = 30
+
+
+def max_poisson_points(width, height, min_distance):
+    """
+    Upper bound of the points min_distance apart that fit the periodic width x height rectangle, from
+    the densest (hexagonal) packing; random sampling saturates at about half of it.
+    """
+    return math.floor(width * height / (math.sqrt(3) / 2 * min_distance ** 2))
+
+
+def poisson_disk_points(width, height, num_points, min_distance, seed=None, candidates=POISSON_CANDIDATES):
+    """
+    num_points random points in the periodic rectangle [0, width) x [0, height), every pair
+    (measured across the periodic boundary too) at least min_distance apart.
+
+    Bridson's sampler on a periodic background grid with cells of at most min_distance / sqrt(2),
+    so a cell holds at most one point and the candidates around a point are tested together against
+    the few surrounding cells; the cost grows linearly with the number of points. A num_points above
+    max_poisson_points raises a ValueError. If the rectangle saturates before num_points (no point
+    fits anywhere any more), the points found are returned with a RuntimeWarning.
+    The same seed gives the same points.
+    """
+    limit = max_poisson_points(width, height, min_distance)
+    if num_points > limit:
+        raise ValueError(
+            f"{num_points} points {min_distance} apart do not fit a {width} x {height} cell, "
+            f"even a hexagonal packing holds only {limit}"
+        )
+
+    rng = np.random.default_rng(seed)
+
+    cell = min_distance / math.sqrt(2)
+    nx = max(1, math.ceil(width / cell))
+    ny = max(1, math.ceil(height / cell))
+    cell_w = width / nx
+    cell_h = height / ny
+    # candidates lie within 2 * min_distance of their parent, their neighbours within min_distance of them
+    reach_x = math.ceil(2 * min_distance / cell_w) + math.ceil(min_distance / cell_w)
+    reach_y = math.ceil(2 * min_distance / cell_h) + math.ceil(min_distance / cell_h)
+    columns = np.arange(-reach_x, reach_x + 1)
+    rows = np.arange(-reach_y, reach_y + 1)
+    min_distance_squared = min_distance ** 2
+
+    grid = np.full((ny, nx), -1, dtype=np.int64)
+    points = np.empty((max(num_points, 0), 2))
+    count = 0
+    active = []
+
+    def add(x, y):
+        nonlocal count
+        grid[min(int(y / cell_h), ny - 1), min(int(x / cell_w), nx - 1)] = count
+        points[count] = x, y
+        active.append(count)
+        count += 1
+
+    if num_points > 0:
+        add(rng.uniform(0, width), rng.uniform(0, height))
+
+    while active and count < num_points:
+        slot = int(rng.integers(len(active)))
+        x, y = points[active[slot]]
+
+        # candidates uniform by area in the annulus [min_distance, 2 * min_distance), wrapped into the cell
+        radii = min_distance * np.sqrt(rng.uniform(1.0, 4.0, candidates))
+        angles = rng.uniform(0.0, 2 * math.pi, candidates)
+        candidate_points = np.column_stack([
+            (x + radii * np.cos(angles)) % width,
+            (y + radii * np.sin(angles)) % height,
+        ])
+
+        # all candidates against the points of the surrounding cells at once, by minimum image distance
+        cx = min(int(x / cell_w), nx - 1)
+        cy = min(int(y / cell_h), ny - 1)
+        neighbours = grid[np.ix_((cy + rows) % ny, (cx + columns) % nx)].ravel()
+        neighbours = points[neighbours[neighbours >= 0]]
+        delta = np.abs(candidate_points[:, np.newaxis, :] - neighbours[np.newaxis])
+        delta = np.minimum(delta, (width, height) - delta)
+        fits = np.all(np.einsum("cnk,cnk->cn", delta, delta) >= min_distance_squared, axis=1)
+
+        if fits.any():
+            add(*candidate_points[np.argmax(fits)])
         else:
-            base_idx = b2
-            other_idx = b1
-            shift = (dx1 - dx2, dy1 - dy2)
+            # nothing fits around this point any more
+            active[slot] = active[-1]
+            active.pop()
+
+    if count < num_points:
+        warnings.warn(
+            f"Poisson-disk sampling saturated at {count} of {num_points} points, min_distance {min_distance} "
+            f"is too large for a {width} x {height} cell",
+            RuntimeWarning,
+            stacklevel=2,
+        )
+
+    return points[:count].copy()
+
+
+def generateStructure(width, height, num_points, point_radius, seed=None):
+    # In rect with width and height, generate num_points random points at least
+    # 2 * point_radius apart (also across the periodic boundary), see poisson_disk_points.
+    # If the rect is full before num_points, return what we have (with a warning).
+    innerPoints = poisson_disk_points(width, height, num_points, 2 * point_radius, seed)
+
+    tile_offsets = tuple((dx * width, dy * height) for dx, dy in TILE_OFFSETS)
+
+    # periodic images of the points within 2 * point_radius of the rect
+    margin = 2 * point_radius
+    tiled = (innerPoints[:, np.newaxis, :] + np.array(tile_offsets)[np.newaxis]).reshape(-1, 2)
+    inside = (
+        (tiled[:, 0] >= -margin) & (tiled[:, 0] <= width + margin)
+        & (tiled[:, 1] >= -margin) & (tiled[:, 1] <= height + margin)
+    )
+    expandedDomainPoints = tiled[inside]
+
+    edges, periodic_edges = periodic_ridges(innerPoints, width, height)
+
+    return (
+        innerPoints,
+        [(b1, b2, length) for (b1, b2), length in zip(edges[0].tolist(), edges[1].tolist())],
+        [
+            (base, other, dx, dy, length)
+            for (base, other), (dx, dy), length in zip(
+                periodic_edges[0].tolist(), periodic_edges[1].tolist(), periodic_edges[2].tolist()
+            )
+        ],
+        expandedDomainPoints,
+    )
+
+
+def periodic_ridges(points, width, height):
+    """
+    Voronoi neighbours of the points of a periodic width x height cell, from the Voronoi diagram of the
+    3 x 3 tiling of the points.
+
+    Returns the ridges between two points of the cell as (pairs (r, 2), ridge lengths (r,)) and the ridges
+    across the boundary as (pairs (p, 2) of base point and neighbour, shifts (p, 2) of the neighbour's image,
+    ridge lengths (p,)). Ridges across the boundary are listed from both sides, with opposite shifts.
+    """
+    points = np.asarray(points, dtype=float)
+    count = len(points)
+    offsets = np.array(TILE_OFFSETS) * (width, height)
+
+    # tiled index = tile * count + point, tile 0 is the cell itself
+    tiled = (offsets[:, np.newaxis, :] + points[np.newaxis]).reshape(-1, 2)
+    vor = Voronoi(tiled)
+
+    ridge_points = vor.ridge_points
+    ridge_vertices = np.array(vor.ridge_vertices, dtype=np.int64)
+    tiles = ridge_points // count
+    bounded = np.all(ridge_vertices >= 0, axis=1)
+    touches_cell = np.any(tiles == 0, axis=1)
+    keep = bounded & touches_cell
+
+    ridge_points = ridge_points[keep]
+    tiles = tiles[keep]
+    vertices = vor.vertices[ridge_vertices[keep]]
+    lengths = np.hypot(*(vertices[:, 1] - vertices[:, 0]).T)
+
+    # orient every ridge so its first point lies in the cell
+    flip = tiles[:, 0] != 0
+    ridge_points[flip] = ridge_points[flip, ::-1]
+    tiles[flip] = tiles[flip, ::-1]
+    pairs = ridge_points % count
+
+    inner = tiles[:, 1] == 0
+    across = ~inner
+    return (
+        (pairs[inner], lengths[inner]),
+        (pairs[across], offsets[tiles[across, 1]], lengths[across]),
+    )
+
+
+def periodic_voronoi_arrays(points, width, height, E=210e6, thickness=1.0):
+    """
+    Periodic truss of the Voronoi neighbours of points in a width x height cell, as structure_arrays style
+    arrays (see structure_parser.truss_from_arrays).
+
+    Every pair of Voronoi neighbours is joined by a member with A = thickness * ridge length. A member
+    crossing the cell boundary ends in an image node of its neighbour; the image depends on that point
+    in x and y with the eigenstrain offset of its shift, the same periodic coupling the tie cells use.
+    Node 0 is fixed against rigid translation. Image nodes follow the points, in order of first use.
+    """
+    points = np.asarray(points, dtype=float)
+    count = len(points)
+    (inner_pairs, inner_lengths), (across_pairs, shifts, across_lengths) = periodic_ridges(points, width, height)
+
+    # a member across the boundary is seen from both of its ends, keep the side with the smaller base index
+    # (for a point next to its own image, the side with the positive shift)
+    base, other = across_pairs.T
+    shift_positive = (shifts[:, 0] > 0) | ((shifts[:, 0] == 0) & (shifts[:, 1] > 0))
+    keep = (base < other) | ((base == other) & shift_positive)
+    base, other, shifts, across_lengths = base[keep], other[keep], shifts[keep], across_lengths[keep]
+
+    image_keys = np.column_stack([other, shifts])
+    unique_keys, first, image_index = np.unique(image_keys, axis=0, return_index=True, return_inverse=True)
+    # images numbered by first use, so the node order does not depend on np.unique's sort
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    image_keys = unique_keys[order]
+    image_index = rank[image_index.reshape(-1)]
+    image_count = len(image_keys)
+    image_master = image_keys[:, 0].astype(np.int64)
+
+    node_count = count + image_count
+    coords = np.concatenate([points, points[image_master] + image_keys[:, 1:]])
+    connectivity = np.concatenate([
+        inner_pairs,
+        np.column_stack([base, count + image_index]),
+    ]).astype(np.int64)
+    A = thickness * np.concatenate([inner_lengths, across_lengths])
+
+    constrained = np.zeros((node_count, 2), dtype=bool)
+    constrained[0] = True
+
+    images = count + np.arange(image_count)
+    directions = np.array([0, 1])
+    return {
+        "coords": coords,
+        "connectivity": connectivity,
+        "E": np.full(len(connectivity), E, dtype=float),
+        "A": A,
+        "constrained": constrained,
+        "deformations": np.zeros((node_count, 2)),
+        "loads": np.zeros((node_count, 2)),
+        "dependent_dof": (images[:, np.newaxis] * 2 + directions).ravel(),
+        "master_dof": (image_master[:, np.newaxis] * 2 + directions).ravel(),
+        "master_factor": np.ones(image_count * 2),
+        "master_eigenstrain": np.ones(image_count * 2, dtype=bool),
+    }
+
+
+def voronoi_arrays(width, height, num_points, point_radius, seed=None, E=210e6, thickness=1.0):
+    """periodic_voronoi_arrays of Poisson-disk points, see poisson_disk_points for the sampling."""
+    points = poisson_disk_points(width, height, num_points, 2 * point_radius, seed)
+    return periodic_voronoi_arrays(points, width, height, E, thickness)
+
+
+def voronoi_truss(width, height, num_points, point_radius, seed=None, E=210e6, thickness=1.0,
+                  eigenstrain_vector=None) -> TrussData:
+    """
+    Solver-ready TrussData of a random periodic Voronoi cell, built from the arrays without any
+    definition objects; the fast path for large cells.
+    """
+    if eigenstrain_vector is None:
+        eigenstrain_vector = np.zeros(3)
+    arrays = voronoi_arrays(width, height, num_points, point_radius, seed, E, thickness)
+    return truss_from_arrays(arrays, width * height, eigenstrain_vector)
+
 
-        key = (base_idx, other_idx, shift[0], shift[1])
-        if key not in seen_periodic:
-            periodic_edges.append((base_idx, other_idx, shift[0], shift[1], ridge_length))
-            seen_periodic.add(key)
+def voronoi_structure(width, height, num_points, point_radius, seed=None, E=210e6, thickness=1.0) -> StructureDefinition:
+    """
+    Random periodic Voronoi cell as a StructureDefinition, see periodic_voronoi_arrays for the truss.
+    The volume is the cell's, not the extent of the nodes, which includes the image nodes.
+    """
+    arrays = voronoi_arrays(width, height, num_points, point_radius, seed, E, thickness)
+    return structure_from_arrays(arrays, volume=width * height)
 
-    return (innerPoints, edges, periodic_edges, expandedDomainPoints)
 
 # Call function and plot with matplotlib.
 if __name__ == "__main__":
@@ -112,7 +292,7 @@ if __name__ == "__main__":
     num_points = 1000
     point_radius = 0.2
     start = perf_counter()
-    points = generateStructure(width, height, num_points, point_radius)
+    points = generateStructure(width, height, num_points, point_radius, seed=0)
     elapsed = perf_counter() - start
     innerPoints, edges, periodic_edges, expandedDomainPoints = points
     x, y = zip(*innerPoints)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules live flat in src and import each other by plain name, as when running src/main.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from assembly import assemble_truss_stiffness
+from batch_solver import BatchTrussSolver, TopologyMismatchError
+from generator import create_periodic_grid, create_tie_structure_angle
+from parameter_solver import homogenize, homogenize_batch
+from structure_parser import parse_structure_data
+
+
+def test_batch_matches_single_solves():
+    structures = [create_tie_structure_angle(0.1, 0.1, angle) for angle in (5.0, 20.0, 40.0)]
+
+    np.testing.assert_allclose(
+        homogenize_batch(structures), [homogenize(structure) for structure in structures], rtol=1e-10, atol=1e-6
+    )
+
+
+def test_batch_matches_single_solves_on_a_grid():
+    structures = [create_periodic_grid(8, 8, 1.0, height) for height in (1.0, 1.5)]
+    Ds = np.array([homogenize(structure) for structure in structures])
+
+    np.testing.assert_allclose(homogenize_batch(structures), Ds, rtol=1e-10, atol=1e-10 * np.abs(Ds).max())
+
+
+def test_batch_reduced_stiffness_matches_assembled():
+    truss = parse_structure_data(create_periodic_grid(3, 2, 1.0, 1.0))
+    solver = BatchTrussSolver([truss])
+
+    T = solver.constraints.free_transformation()
+    expected = (T.T @ assemble_truss_stiffness(truss) @ T).toarray()
+
+    np.testing.assert_allclose(solver.reduced_stiffness_matrices()[0], expected, atol=1e-9 * np.abs(expected).max())
+
+
+def test_batch_refuses_other_topologies_and_large_trusses():
+    with pytest.raises(TopologyMismatchError):
+        BatchTrussSolver([parse_structure_data(create_periodic_grid(n, 2, 1.0, 1.0)) for n in (2, 3)])
+    with pytest.raises(ValueError, match="DENSE_THRESHOLD"):
+        BatchTrussSolver([parse_structure_data(create_periodic_grid(30, 30, 1.0, 1.0))])
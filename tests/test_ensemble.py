@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from ensemble import rve_size_study, run_ensemble
+
+
+def test_ensemble_records_full_realizations():
+    result = run_ensemble(1.0, 1.0, 20, 0.03, min_samples=3, max_samples=3, verbose=False)
+
+    assert result.samples == 3
+    np.testing.assert_array_equal(result.cells, [20, 20, 20])
+
+
+def test_ensemble_warns_about_saturated_realizations():
+    with pytest.warns(RuntimeWarning, match="realizations of 120 points saturated"):
+        result = run_ensemble(1.0, 1.0, 120, 0.045, min_samples=2, max_samples=2, verbose=False)
+
+    assert np.all(result.cells < 120)
+
+
+def test_size_study_rejects_impossible_density_up_front():
+    with pytest.raises(ValueError, match="hexagonal packing"):
+        rve_size_study([40, 80], 0.5, 0.5, 0.05, verbose=False)
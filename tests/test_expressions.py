@@ -0,0 +1,34 @@
+import pytest
+
+from expressions import parse_expression
+
+
+@pytest.mark.parametrize("expression, value", [
+    ("0.02", 0.02),
+    ("-4/3", -4 / 3),
+    ("(1 + 2) / 3", 1.0),
+    ("2**0.5", 2 ** 0.5),
+    ("-2**2", -4.0),
+    (7, 7),
+])
+def test_parse_expression_values(expression, value):
+    assert parse_expression(expression) == value
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("1/0", "division by zero"),
+    ("1/0.0", "division by zero"),
+    ("0**-1", "division by zero"),
+    ("9**9**9", "result too large"),
+    ("(" * 5000 + "1" + ")" * 5000, "nested too deeply"),
+    ("-" * 5000 + "1", "nested too deeply"),
+    ("1e400", "not a finite real number"),
+    ("1e308*10", "not a finite real number"),
+    ("(-8)**0.5", "not a finite real number"),
+    ("__import__('os')", "unexpected"),
+    ("", "empty"),
+    (None, "expected a string or a number"),
+])
+def test_parse_expression_rejects_invalid_input(expression, message):
+    with pytest.raises(ValueError, match=message):
+        parse_expression(expression)
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pytest
+
+from assembly import element_arrays, element_dofs, element_stiffness_blocks
+from conftest import DATA_DIR
+from generator import create_periodic_grid_truss
+from iterative import ElementOperator, build_preconditioner
+from parameter_solver import eigenstrainSets
+from solver import TrussSolver
+from structure_parser import parse_json_file
+
+
+def test_cg_matches_direct_solve():
+    truss = parse_json_file(os.path.join(DATA_DIR, "grid.json"))
+    macro_strains = np.array(eigenstrainSets)
+
+    direct = TrussSolver(truss, backend="sparse").solve_macro_strains(macro_strains)
+    iterative = TrussSolver(truss, backend="cg", tolerance=1e-12).solve_macro_strains(macro_strains)
+
+    np.testing.assert_allclose(iterative, direct, rtol=1e-6, atol=1e-6 * np.abs(direct).max())
+
+
+def test_cg_warns_when_not_converged():
+    truss = parse_json_file(os.path.join(DATA_DIR, "grid.json"))
+    solver = TrussSolver(truss, backend="cg", max_iterations=1)
+
+    with pytest.warns(RuntimeWarning, match="CG did not reach the tolerance"):
+        solver.solve_macro_strains(np.array(eigenstrainSets))
+
+    assert not any(solver.iterative_info.converged)
+    assert all(iterations <= 1 for iterations in solver.iterative_info.iterations)
+
+
+@pytest.mark.parametrize("preconditioner", ["jacobi", "ilu", "none"])
+def test_cg_preconditioners_converge_on_a_grid(preconditioner):
+    truss = create_periodic_grid_truss(20, 20, 1.0, 1.0)
+    macro_strains = np.array(eigenstrainSets)
+
+    direct = TrussSolver(truss, backend="sparse").solve_macro_strains(macro_strains)
+    solver = TrussSolver(truss, backend="cg", preconditioner=preconditioner, tolerance=1e-12)
+    iterative = solver.solve_macro_strains(macro_strains)
+
+    assert all(solver.iterative_info.converged)
+    np.testing.assert_allclose(iterative, direct, rtol=1e-6, atol=1e-6 * np.abs(direct).max())
+
+
+def test_ilu_preconditioner_is_symmetric_positive_definite():
+    truss = create_periodic_grid_truss(6, 6, 1.0, 1.0)
+    coords, connectivity, E, A = element_arrays(truss)
+    operator = ElementOperator(
+        element_stiffness_blocks(coords, connectivity, E, A),
+        element_dofs(connectivity),
+        TrussSolver(truss).constraints.free_transformation(),
+    )
+
+    M = build_preconditioner(operator, "ilu") @ np.eye(operator.shape[0])
+
+    np.testing.assert_allclose(M, M.T, atol=1e-12 * np.abs(M).max())
+    assert np.linalg.eigvalsh((M + M.T) / 2).min() > 0
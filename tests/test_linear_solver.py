@@ -0,0 +1,31 @@
+import numpy as np
+from scipy.sparse import bmat, csr_matrix, diags
+
+from linear_solver import solve_direct
+
+
+def _laplacian(size: int) -> csr_matrix:
+    return diags([-np.ones(size - 1), 2.5 * np.ones(size), -np.ones(size - 1)], [-1, 0, 1], format="csr")
+
+
+def test_sparse_matches_dense_for_positive_definite_systems():
+    matrix = _laplacian(200)
+    rhs = np.random.default_rng(0).standard_normal((200, 3))
+
+    sparse, info = solve_direct("sparse", matrix, rhs)
+    dense, _ = solve_direct("dense", matrix, rhs)
+
+    assert info.method == "superlu"
+    np.testing.assert_allclose(sparse, dense, rtol=1e-10, atol=1e-12)
+
+
+def test_sparse_solves_indefinite_saddle_point_systems():
+    # KKT layout of the Lagrange solver: zero diagonal block for the multipliers
+    stiffness = _laplacian(50)
+    constraints = csr_matrix(np.eye(5, 50))
+    matrix = bmat([[stiffness, constraints.T], [constraints, None]], format="csr")
+    rhs = np.random.default_rng(1).standard_normal(55)
+
+    solution, _ = solve_direct("sparse", matrix, rhs, positive_definite=False)
+
+    np.testing.assert_allclose(matrix @ solution, rhs, atol=1e-10)
@@ -0,0 +1,72 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from material_fit import (
+    ORTO_BOUNDS,
+    fit_iso,
+    fit_orto,
+    iso_D,
+    least_squares_fit,
+    orto_D,
+    orto_D_jacobian,
+)
+
+
+def _orto_Ds(count: int, noise: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(0)
+    params = np.column_stack([
+        rng.uniform(1e5, 1e9, count),
+        rng.uniform(1e5, 1e9, count),
+        rng.uniform(-0.5, 0.5, count),
+        rng.uniform(-0.5, 0.5, count),
+        rng.uniform(1e4, 1e8, count),
+    ])
+    return params, orto_D(params) * (1 + noise * rng.standard_normal((count, 3, 3)))
+
+
+def test_least_squares_recovers_exact_parameters():
+    params, Ds = _orto_Ds(20)
+    np.testing.assert_allclose(fit_orto(Ds), params, rtol=1e-8)
+    np.testing.assert_allclose(fit_iso(iso_D(np.array([3e7, 0.3]))), [3e7, 0.3], rtol=1e-8)
+
+
+def test_least_squares_fit_does_not_depend_on_the_stack():
+    _, Ds = _orto_Ds(40, noise=0.05)
+    initial_guess = np.array([210e6, 210e6, 0.4, 0.4, 21e6])
+
+    stacked, stacked_costs = least_squares_fit(Ds, orto_D, orto_D_jacobian, initial_guess, ORTO_BOUNDS)
+    chunks = [
+        least_squares_fit(Ds[start:start + 7], orto_D, orto_D_jacobian, initial_guess, ORTO_BOUNDS)
+        for start in range(0, len(Ds), 7)
+    ]
+
+    np.testing.assert_array_equal(np.concatenate([params for params, _ in chunks]), stacked)
+    np.testing.assert_array_equal(np.concatenate([costs for _, costs in chunks]), stacked_costs)
+
+
+def test_least_squares_fit_stays_within_bounds():
+    # far too soft for the lower E bound, the fit ends on it
+    Ds = orto_D(np.array([1e2, 1e2, 0.3, 0.3, 1e2])) * 1e-3
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", RuntimeWarning)
+        params = fit_orto(Ds)
+
+    assert np.all(params >= ORTO_BOUNDS[0]) and np.all(params <= ORTO_BOUNDS[1])
+    np.testing.assert_allclose(params[:2], ORTO_BOUNDS[0][:2])
+
+
+def test_least_squares_fit_warns_when_not_converged():
+    _, Ds = _orto_Ds(3, noise=0.05)
+    with pytest.warns(RuntimeWarning, match="did not converge"):
+        least_squares_fit(Ds, orto_D, orto_D_jacobian, np.array([210e6, 210e6, 0.4, 0.4, 21e6]), ORTO_BOUNDS, max_iterations=1)
+
+
+def test_non_finite_D_gives_nan_parameters():
+    _, Ds = _orto_Ds(2)
+    Ds[1, 2, 2] = np.nan
+    params = fit_orto(Ds)
+
+    assert np.all(np.isfinite(params[0]))
+    assert np.all(np.isnan(params[1]))
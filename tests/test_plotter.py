@@ -0,0 +1,73 @@
+import os
+import re
+
+import numpy as np
+import pytest
+
+from assembly import element_arrays
+from conftest import DATA_DIR
+from parameter_solver import eigenstrainSets
+from plotter import decimate_members, write_typst
+from solver import TrussSolver
+from structure_parser import parse_json_file
+
+
+def _multi_case_solver():
+    truss = parse_json_file(os.path.join(DATA_DIR, "grid.json"))
+    solver = TrussSolver(truss)
+    solver.solve_macro_strains(np.array(eigenstrainSets))
+    return truss, solver
+
+
+def _typst_block(content: str, name: str) -> list:
+    block = re.search(rf"#let {name} = \(\n(.*?)\)\n", content, re.S).group(1)
+    return [line.strip().rstrip(",") for line in block.splitlines()]
+
+
+def test_write_typst_multi_case_requires_case(tmp_path):
+    truss, solver = _multi_case_solver()
+
+    with pytest.raises(ValueError, match="3 load cases"):
+        write_typst(str(tmp_path / "truss.typ"), truss, solver.displacements, solver.axial_forces)
+    with pytest.raises(ValueError, match="case 3 does not exist"):
+        write_typst(str(tmp_path / "truss.typ"), truss, solver.displacements, solver.axial_forces, case=3)
+
+
+@pytest.mark.parametrize("max_members", [None, 5])
+def test_write_typst_multi_case_writes_one_case(tmp_path, max_members):
+    truss, solver = _multi_case_solver()
+    case = 2
+    path = tmp_path / "truss.typ"
+
+    write_typst(str(path), truss, solver.displacements, solver.axial_forces, max_members=max_members, case=case)
+    content = path.read_text()
+
+    coords, connectivity, _, _ = element_arrays(truss)
+    forces = solver.axial_forces[:, case]
+    members = decimate_members(coords, connectivity, forces, max_members)
+    written_forces = np.array([float(force) for force in _typst_block(content, "forces")])
+    np.testing.assert_allclose(written_forces, forces[members])
+
+    nodes = np.unique(connectivity[members])
+    written_displacements = np.array(
+        [[float(value) for value in row.strip("()").split(",")] for row in _typst_block(content, "displacements")]
+    )
+    np.testing.assert_allclose(written_displacements, solver.displacements[:, case].reshape(-1, 2)[nodes])
+
+
+def test_write_typst_single_case_matches_multi_case_column(tmp_path):
+    truss, solver = _multi_case_solver()
+
+    write_typst(str(tmp_path / "multi.typ"), truss, solver.displacements, solver.axial_forces, case=1)
+    write_typst(str(tmp_path / "single.typ"), truss, solver.displacements[:, 1])
+
+    assert (tmp_path / "multi.typ").read_text() == (tmp_path / "single.typ").read_text()
+
+
+def test_decimate_members_rejects_multi_case_forces():
+    truss, solver = _multi_case_solver()
+    coords, connectivity, _, _ = element_arrays(truss)
+
+    with pytest.raises(ValueError, match="one load case"):
+        decimate_members(coords, connectivity, solver.axial_forces, max_members=5)
+
@@ -0,0 +1,37 @@
+import csv
+
+import numpy as np
+
+from generator import create_periodic_grid
+from material_fit import fit_orto
+from parameter_solver import homogenize
+from sweep import BATCH_DOF_THRESHOLD, run_sweep, solve_points
+
+
+def test_sweep_over_periodic_grids(tmp_path):
+    # 4x4 cells are batched, 12x12 cells exceed BATCH_DOF_THRESHOLD and are solved one by one
+    assert 2 * 4 * 4 <= BATCH_DOF_THRESHOLD < 2 * 12 * 12
+    grid = {"nx": [4, 12], "height": [1.0, 1.5]}
+    path = tmp_path / "sweep.csv"
+
+    solved = run_sweep(
+        create_periodic_grid, grid, str(path), fixed={"ny": 4, "width": 1.0}, chunksize=4, verbose=False
+    )
+
+    with open(path) as f:
+        rows = list(csv.reader(f))
+    assert solved == 4
+    assert rows[0] == ["nx", "height", "Ex", "Ey", "vxy", "vyx", "Gxy"]
+
+    for row in rows[1:]:
+        nx, height = int(float(row[0])), float(row[1])
+        D = homogenize(create_periodic_grid(nx, 4, 1.0, height))
+        np.testing.assert_allclose([float(value) for value in row[2:]], fit_orto(D), rtol=1e-6)
+
+
+def test_solve_points_mixes_batched_and_single_structures():
+    points = [(4,), (4,), (12,)]
+    task = (create_periodic_grid, {"ny": 12, "width": 1.0, "height": 1.0}, ["nx"], points, "orto", "least_squares", None)
+
+    expected = fit_orto(np.array([homogenize(create_periodic_grid(nx, 12, 1.0, 1.0)) for nx, in points]))
+    np.testing.assert_allclose(solve_points(task), expected, rtol=1e-6)
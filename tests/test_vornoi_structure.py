@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from vornoi_structure import max_poisson_points, poisson_disk_points
+
+
+def test_poisson_disk_points_reaches_the_count():
+    points = poisson_disk_points(10, 5, 700, 0.2, seed=0)
+
+    assert len(points) == 700
+    delta = np.abs(points[:, np.newaxis] - points[np.newaxis])
+    delta = np.minimum(delta, (10, 5) - delta)
+    distances = np.sqrt((delta ** 2).sum(axis=-1)) + np.eye(len(points)) * 1e9
+    assert distances.min() >= 0.2
+
+
+def test_poisson_disk_points_warns_when_saturated():
+    with pytest.warns(RuntimeWarning, match="saturated at"):
+        points = poisson_disk_points(10, 5, 1000, 0.2, seed=0)
+    assert len(points) < 1000
+
+
+def test_poisson_disk_points_rejects_impossible_density():
+    with pytest.raises(ValueError, match="hexagonal packing"):
+        poisson_disk_points(10, 5, max_poisson_points(10, 5, 0.2) + 1, 0.2, seed=0)